@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+XML 响应解析基准：对比一次性 etree.fromstring 加逐字段 findtext 的旧写法与
+models 中增量解析（iterparse + 元素释放）的记录解析
+
+每种解析方式在独立的子进程中运行，分别统计耗时和进程内存峰值
+
+运行:
+    python benchmarks/bench_parsing.py [条目数]
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import subprocess
+from cStringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lxml import etree
+
+from speedycloud.object_storage.models import (
+    S3_NS, ObjectSummary, Version, findtext, iter_list_bucket, iter_list_versions)
+
+
+def versions_document(count):
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+             '<ListVersionsResult xmlns="%s"><Name>bench</Name><Prefix></Prefix>'
+             '<KeyMarker></KeyMarker><VersionIdMarker></VersionIdMarker>'
+             '<MaxKeys>%d</MaxKeys><IsTruncated>false</IsTruncated>' % (S3_NS, count)]
+    for i in xrange(count):
+        if i % 10 == 9:
+            parts.append(
+                '<DeleteMarker><Key>logs/2018/06/%08d.json</Key><VersionId>v%016d</VersionId>'
+                '<IsLatest>true</IsLatest><LastModified>2018-06-21T10:00:00.000Z</LastModified>'
+                '<Owner><ID>owner</ID><DisplayName>owner</DisplayName></Owner>'
+                '</DeleteMarker>' % (i // 2, i))
+        else:
+            parts.append(
+                '<Version><Key>logs/2018/06/%08d.json</Key><VersionId>v%016d</VersionId>'
+                '<IsLatest>%s</IsLatest><LastModified>2018-06-21T10:00:00.000Z</LastModified>'
+                '<ETag>&quot;d41d8cd98f00b204e9800998ecf8427e&quot;</ETag><Size>%d</Size>'
+                '<Owner><ID>owner</ID><DisplayName>owner</DisplayName></Owner>'
+                '<StorageClass>STANDARD</StorageClass></Version>' % (
+                    i // 2, i, 'false' if i % 2 else 'true', i * 7))
+    parts.append('</ListVersionsResult>')
+    return ''.join(parts)
+
+
+def bucket_document(count):
+    parts = ['<?xml version="1.0" encoding="UTF-8"?>\n'
+             '<ListBucketResult xmlns="%s"><Name>bench</Name><Prefix></Prefix><Marker></Marker>'
+             '<MaxKeys>%d</MaxKeys><IsTruncated>false</IsTruncated>' % (S3_NS, count)]
+    for i in xrange(count):
+        parts.append(
+            '<Contents><Key>logs/2018/06/%08d.json</Key>'
+            '<LastModified>2018-06-21T10:00:00.000Z</LastModified>'
+            '<ETag>&quot;d41d8cd98f00b204e9800998ecf8427e&quot;</ETag><Size>%d</Size>'
+            '<Owner><ID>owner</ID><DisplayName>owner</DisplayName></Owner>'
+            '<StorageClass>STANDARD</StorageClass></Contents>' % (i, i * 7))
+    parts.append('</ListBucketResult>')
+    return ''.join(parts)
+
+
+def legacy_versions(xml):
+    # parse the whole document, then look every field up by name
+    root = etree.fromstring(xml)
+    records = []
+    for name in ('Version', 'DeleteMarker'):
+        for element in root.iter('{%s}%s' % (S3_NS, name)):
+            size = findtext(element, 'Size')
+            records.append(Version(
+                findtext(element, 'Key'), findtext(element, 'VersionId'),
+                findtext(element, 'IsLatest') == 'true', int(size) if size else None,
+                findtext(element, 'ETag'), findtext(element, 'LastModified'),
+                name == 'DeleteMarker'))
+    return len(records)
+
+
+def streaming_versions(xml):
+    count = 0
+    for version in iter_list_versions(StringIO(xml), {}):
+        count += 1
+    return count
+
+
+def legacy_bucket(xml):
+    root = etree.fromstring(xml)
+    records = []
+    for element in root.iter('{%s}Contents' % S3_NS):
+        records.append(ObjectSummary(
+            findtext(element, 'Key'), int(findtext(element, 'Size')),
+            findtext(element, 'ETag'), findtext(element, 'LastModified')))
+    return len(records)
+
+
+def streaming_bucket(xml):
+    count = 0
+    for record in iter_list_bucket(StringIO(xml), {}):
+        count += 1
+    return count
+
+
+CASES = (
+    ('versions_legacy', versions_document, legacy_versions),
+    ('versions_iterparse', versions_document, streaming_versions),
+    ('bucket_legacy', bucket_document, legacy_bucket),
+    ('bucket_iterparse', bucket_document, streaming_bucket),
+)
+
+
+def run_case(name, count):
+    for case, make_document, parse in CASES:
+        if case == name:
+            break
+    xml = make_document(count)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.time()
+    parsed = parse(xml)
+    elapsed = time.time() - start
+    assert parsed == count, parsed
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'records': parsed,
+        'document_bytes': len(xml),
+        'seconds': elapsed,
+        'records_per_sec': parsed / elapsed,
+        # ru_maxrss is in KB on Linux
+        'peak_rss_growth_kb': peak - baseline,
+    }
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--case':
+        print json.dumps(run_case(sys.argv[2], int(sys.argv[3])))
+        return
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    results = {}
+    for name, make_document, parse in CASES:
+        # a fresh process per case keeps the memory peaks apart
+        output = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--case', name, str(count)],
+            stdout=subprocess.PIPE).communicate()[0]
+        results[name] = json.loads(output)
+    for kind in ('versions', 'bucket'):
+        results['%s_speedup' % kind] = (results['%s_legacy' % kind]['seconds'] /
+                                        results['%s_iterparse' % kind]['seconds'])
+    print json.dumps(results, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
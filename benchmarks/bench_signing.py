@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+请求签名微基准：对比每次重新创建 HMAC、重复格式化日期的旧实现与当前实现
+
+运行:
+    python benchmarks/bench_signing.py [次数]
+"""
+
+import os
+import sys
+import base64
+import hashlib
+import hmac
+import json
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from speedycloud.object_storage import AbstractProductAPI
+
+api = AbstractProductAPI('ACCESS-KEY', 'SECRET-KEY-' + 'x' * 30)
+PATH = '/bucket/some/object/key.json'
+PARAMS = {'x-amz-acl': 'public-read', 'content_type': 'application/json'}
+
+
+def legacy_headers():
+    request_date = datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT')
+    sign_str = '\n'.join([
+        'PUT', '', PARAMS['content_type'],
+        str(datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT')),
+        'x-amz-acl:%s' % PARAMS['x-amz-acl'], PATH])
+    sign = base64.b64encode(
+        hmac.new(api.secret_key, sign_str, digestmod=hashlib.sha1).digest())
+    return {
+        'Date': request_date,
+        'Authorization': 'AWS %s:%s' % (api.access_key, sign),
+        'x-amz-acl': PARAMS['x-amz-acl'],
+        'Content-Type': PARAMS['content_type'],
+    }
+
+
+def current_headers():
+    return api._generate_headers('PUT', PATH, PARAMS)
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    results = {}
+    for name, fn in (('legacy', legacy_headers), ('current', current_headers)):
+        best = min(timeit.repeat(fn, number=number, repeat=3))
+        results[name] = {'usec_per_request': best / number * 1e6,
+                         'requests_per_sec': number / best}
+    results['speedup'] = (results['legacy']['usec_per_request'] /
+                          results['current']['usec_per_request'])
+    print json.dumps(results, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+冷启动基准：在新进程中测量 import speedycloud、创建客户端和第一个请求（针对进程内
+模拟服务 fake_server.py）的耗时，以及此时已加载的模块和线程，模拟命令行工具或
+短生命周期任务的启动开销
+
+运行:
+    python benchmarks/bench_startup.py [次数]
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+BUCKET = 'bench'
+KEY = 'startup'
+
+
+def child(host):
+    start = time.time()
+    import speedycloud
+    imported = time.time()
+    api = speedycloud.create_object_storage_api('BENCH-ACCESS-KEY', 'BENCH-SECRET-KEY')
+    constructed = time.time()
+    async_api = speedycloud.create_async_object_storage_api(
+        'BENCH-ACCESS-KEY', 'BENCH-SECRET-KEY')
+    async_constructed = time.time()
+    threads = len(sys._current_frames())
+    modules = len(sys.modules)
+    lxml_loaded = 'lxml.etree' in sys.modules
+
+    api.host = host
+    first = time.time()
+    data = api.download_object_data(BUCKET, KEY)
+    done = time.time()
+    assert data == 'x' * 1024, len(data)
+    async_api.close()
+    return {
+        'import_seconds': imported - start,
+        'construct_seconds': constructed - imported,
+        'async_construct_seconds': async_constructed - constructed,
+        'first_request_seconds': done - first,
+        'modules_after_construct': modules,
+        'threads_after_construct': threads,
+        'lxml_loaded_before_request': lxml_loaded,
+    }
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--child':
+        print json.dumps(child(sys.argv[2]))
+        return
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    sys.path.insert(0, BENCH_DIR)
+    from fake_server import FakeObjectStorage, ServerConfig
+    server = FakeObjectStorage(ServerConfig())
+    server.start()
+    server.store.put(BUCKET, KEY, 'x' * 1024)
+    samples = []
+    process_seconds = []
+    try:
+        for _ in xrange(runs):
+            start = time.time()
+            output = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--child', server.host],
+                stdout=subprocess.PIPE).communicate()[0]
+            process_seconds.append(time.time() - start)
+            samples.append(json.loads(output))
+    finally:
+        server.stop()
+
+    results = {'runs': runs, 'process_seconds_median': median(process_seconds)}
+    for name in samples[0]:
+        values = [sample[name] for sample in samples]
+        if name.endswith('_seconds'):
+            results[name[:-len('_seconds')] + '_ms_median'] = median(values) * 1000
+            results[name[:-len('_seconds')] + '_ms_min'] = min(values) * 1000
+        else:
+            results[name] = values[0]
+    print json.dumps(results, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
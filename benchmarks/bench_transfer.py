@@ -0,0 +1,839 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+端到端基准：在进程内启动模拟对象存储服务（fake_server.py），运行固定场景并输出 JSON
+
+场景:
+    small_objects: 小对象并发 PUT/GET 的每秒操作数和延迟分位数
+    large_object: 大对象单次 PUT 和流式 GET 的吞吐量
+    listing: 分页遍历大量对象的速度
+    multipart: 不同分段大小和并发数下的分段上传吞吐量
+    compression: JSON 数据开启/关闭压缩时的传输字节数和耗时（建议配合 --bandwidth）
+    pool_contention: 线程数远多于连接数时的请求速度和连接池等待
+    endpoints: 快、慢、不稳定三个服务地址（共享数据）之间按不同策略分配读请求的速度和分布
+    copy: 下载再上传、服务端单次复制和并发分段复制大对象的耗时和经过客户端的字节数
+    multipart_keys: 含空格、非 ASCII 和特殊字符的对象名的分段上传、分段复制、查询和取消
+    journal_resume: 非 ASCII 路径和对象名的断点续传只补传缺少的分段，文件修改后重新上传
+    async_api: AsyncObjectStorageAPI 并发读写、异常经 Future 返回、close 释放连接
+    presigned: 预签名 URL 的生成速度，以及不经过 SDK 的下载、上传和分段上传
+    caches: 元数据缓存（LRUCache/DiskCache）命中与写入后失效，DownloadCache 的 304 命中和淘汰
+    transfer_manager: 目录双向同步、重复同步全部跳过、带宽限制不影响传入的客户端、拒绝越界对象名
+    retries: 随机 503 下 RetryPolicy 重试成功，服务不可用时 RetryBudget 限制重试总数
+    integrity: 校验开关对下载速度的影响，ETag 不一致时抛出 IntegrityError 并归还连接
+
+除性能数据外，各场景用 assert 检查结果，结果不正确时以 AssertionError 退出
+
+运行:
+    python benchmarks/bench_transfer.py [--scenario small_objects] [--latency 0.005]
+        [--bandwidth 104857600] [--error-rate 0.01] [--quick] [--output result.json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import httplib
+import urlparse
+import tempfile
+import threading
+import platform
+import optparse
+from StringIO import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fake_server import FakeObjectStorage, ServerConfig
+from speedycloud.object_storage import ConnectionPool, ProductAPIError
+from speedycloud.object_storage.async_api import AsyncObjectStorageAPI, gather
+from speedycloud.object_storage.cache import DiskCache, LRUCache
+from speedycloud.object_storage.compression import Compression
+from speedycloud.object_storage.download_cache import DownloadCache
+from speedycloud.object_storage.endpoints import Endpoint, EndpointRouter
+from speedycloud.object_storage.hooks import MetricsCollector
+from speedycloud.object_storage.integrity import IntegrityError
+from speedycloud.object_storage.object_storage import ObjectStorageAPI
+from speedycloud.object_storage.retry import RetryBudget, RetryPolicy
+from speedycloud.object_storage.sync import TransferManager
+from speedycloud.object_storage.transfer import MAX_PART_SIZE, MIN_PART_SIZE
+
+MB = 1024 * 1024
+BUCKET = 'bench'
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def latency_summary(values):
+    return {
+        'p50_ms': percentile(values, 0.5) * 1000,
+        'p90_ms': percentile(values, 0.9) * 1000,
+        'p99_ms': percentile(values, 0.99) * 1000,
+        'max_ms': max(values) * 1000,
+    }
+
+
+def create_api(server, pool_size=10, max_pool_size=100):
+    api = ObjectStorageAPI('BENCH-ACCESS-KEY', 'BENCH-SECRET-KEY')
+    api.host = server.host
+    api.pool = ConnectionPool(server.host, 'http', size=pool_size, max_size=max_pool_size)
+    metrics = MetricsCollector()
+    metrics.install(api)
+    return api, metrics
+
+
+def run_threads(threads, count, fn):
+    """
+    用 threads 个线程执行 fn(i)，i 取 0..count-1，返回 (总耗时, 每次调用的耗时)
+    """
+    latencies = []
+    lock = threading.Lock()
+    counter = iter(xrange(count))
+
+    def worker():
+        local = []
+        while True:
+            lock.acquire()
+            try:
+                i = next(counter, None)
+            finally:
+                lock.release()
+            if i is None:
+                break
+            start = time.time()
+            fn(i)
+            local.append(time.time() - start)
+        lock.acquire()
+        try:
+            latencies.extend(local)
+        finally:
+            lock.release()
+
+    start = time.time()
+    workers = [threading.Thread(target=worker) for _ in xrange(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.time() - start, latencies
+
+
+def request_counts(metrics):
+    snapshot = metrics.snapshot()
+    return {
+        'requests': snapshot['requests'],
+        'errors': snapshot['errors'],
+        'retries': snapshot['retries'],
+        'connections_created': snapshot['connections_created'],
+    }
+
+
+def small_objects(server, options):
+    count = 500 if options.quick else 5000
+    size = 4 * 1024
+    threads = 16
+    data = os.urandom(size)
+    result = {'objects': count, 'object_size': size, 'threads': threads}
+
+    api, metrics = create_api(server)
+    elapsed, latencies = run_threads(threads, count, lambda i: api.storing_object_data(
+        BUCKET, 'small/%06d' % i, data, 'string'))
+    result['put'] = dict(latency_summary(latencies), ops_per_sec=count / elapsed)
+
+    elapsed, latencies = run_threads(threads, count, lambda i: api.download_object_data(
+        BUCKET, 'small/%06d' % i))
+    result['get'] = dict(latency_summary(latencies), ops_per_sec=count / elapsed)
+    result.update(request_counts(metrics))
+    return result
+
+
+def large_object(server, options):
+    size = (32 if options.quick else 256) * MB
+    path = make_file(size)
+    result = {'object_size': size}
+    try:
+        api, metrics = create_api(server)
+        start = time.time()
+        api.storing_object_data(BUCKET, 'large', path, 'file')
+        elapsed = time.time() - start
+        result['put'] = {'seconds': elapsed, 'mb_per_sec': size / elapsed / MB}
+
+        start = time.time()
+        received = 0
+        for chunk in api.download_object_stream(BUCKET, 'large'):
+            received += len(chunk)
+        elapsed = time.time() - start
+        assert received == size, received
+        result['get'] = {'seconds': elapsed, 'mb_per_sec': size / elapsed / MB}
+        result.update(request_counts(metrics))
+    finally:
+        os.remove(path)
+        server.store.delete(BUCKET, 'large')
+    return result
+
+
+def listing(server, options):
+    count = 20000 if options.quick else 100000
+    for i in xrange(count):
+        server.store.put(BUCKET, 'list/%08d' % i, '', '"d41d8cd98f00b204e9800998ecf8427e"')
+    result = {'objects': count}
+    try:
+        for page_size, prefetch in ((1000, False), (1000, True), (100, False)):
+            api, metrics = create_api(server)
+            start = time.time()
+            seen = 0
+            for record in api.iter_objects(BUCKET, 'list/', page_size=page_size,
+                                           prefetch=prefetch):
+                seen += 1
+            elapsed = time.time() - start
+            assert seen == count, seen
+            name = 'page_%d%s' % (page_size, '_prefetch' if prefetch else '')
+            result[name] = dict(request_counts(metrics), seconds=elapsed,
+                                keys_per_sec=count / elapsed)
+    finally:
+        for i in xrange(count):
+            server.store.delete(BUCKET, 'list/%08d' % i)
+    return result
+
+
+def multipart(server, options):
+    size = (64 if options.quick else 256) * MB
+    path = make_file(size)
+    result = {'object_size': size, 'runs': []}
+    try:
+        for part_size in (5 * MB, 16 * MB, 64 * MB):
+            for workers in (1, 4, 16):
+                if options.quick and workers == 16:
+                    continue
+                api, metrics = create_api(server)
+                start = time.time()
+                api.upload_big_data(BUCKET, 'multipart', path, {}, part_size=part_size,
+                                    workers=workers)
+                elapsed = time.time() - start
+                result['runs'].append(dict(
+                    request_counts(metrics), part_size=part_size, workers=workers,
+                    seconds=elapsed, mb_per_sec=size / elapsed / MB))
+                server.store.delete(BUCKET, 'multipart')
+    finally:
+        os.remove(path)
+    return result
+
+
+def compression(server, options):
+    records = 20000 if options.quick else 200000
+    path = make_json_file(records)
+    size = os.path.getsize(path)
+    result = {'object_size': size, 'runs': []}
+    try:
+        for codec in (None, Compression('gzip', level=1), Compression('gzip', level=6),
+                      Compression('gzip', level=6, chunked=True)):
+            api, metrics = create_api(server)
+            api.compression = codec
+            start = time.time()
+            api.storing_object_data(BUCKET, 'compression.json', path, 'file')
+            put_seconds = time.time() - start
+            start = time.time()
+            received = 0
+            for chunk in api.download_object_stream(BUCKET, 'compression.json'):
+                received += len(chunk)
+            get_seconds = time.time() - start
+            assert received == size, received
+            snapshot = metrics.snapshot()
+            result['runs'].append({
+                'encoding': codec.encoding if codec else None,
+                'level': codec.level if codec else None,
+                'chunked': codec.chunked if codec else False,
+                'bytes_sent': len(server.store.get(BUCKET, 'compression.json')[0]),
+                'bytes_received': snapshot['bytes_received'],
+                'put_seconds': put_seconds,
+                'get_seconds': get_seconds,
+            })
+    finally:
+        os.remove(path)
+        server.store.delete(BUCKET, 'compression.json')
+    return result
+
+
+def pool_contention(server, options):
+    count = 2000 if options.quick else 20000
+    server.store.put(BUCKET, 'contention', 'x')
+    result = {'requests': count, 'runs': []}
+    for threads, max_pool_size in ((64, 8), (64, 64), (256, 16)):
+        api, metrics = create_api(server, pool_size=max_pool_size, max_pool_size=max_pool_size)
+        # a full pool makes the threads wait for each other instead of failing
+        api.pool.timeout = None
+        elapsed, latencies = run_threads(threads, count, lambda i: api.head_object(
+            BUCKET, 'contention'))
+        stats = api.pool.stats()
+        result['runs'].append(dict(
+            latency_summary(latencies), threads=threads, max_pool_size=max_pool_size,
+            ops_per_sec=count / elapsed, pool_waits=stats['waits'],
+            pool_wait_seconds=stats['wait_time'],
+            connections_created=request_counts(metrics)['connections_created']))
+    return result
+
+
+def endpoints(server, options):
+    count = 1000 if options.quick else 10000
+    threads = 16
+    config = server.config
+    # extra gateways in front of the same data: one slower, one failing often
+    slow = FakeObjectStorage(ServerConfig(latency=config.latency + 0.02,
+                                          bandwidth=config.bandwidth, seed=options.seed))
+    flaky = FakeObjectStorage(ServerConfig(latency=config.latency, bandwidth=config.bandwidth,
+                                           error_rate=0.3, seed=options.seed))
+    for extra in (slow, flaky):
+        extra.store = server.store
+        extra.start()
+    server.store.put(BUCKET, 'endpoints', 'x' * 4096)
+    hosts = {server.host: 'fast', slow.host: 'slow', flaky.host: 'flaky'}
+    result = {'requests': count, 'threads': threads, 'runs': []}
+    try:
+        for name, strategy, members in (('slow_only', 'latency', (slow,)),
+                                        ('latency', 'latency', (server, slow, flaky)),
+                                        ('least_outstanding', 'least_outstanding',
+                                         (server, slow, flaky))):
+            router = EndpointRouter([Endpoint(s.host) for s in members], strategy=strategy)
+            api, metrics = create_api(server)
+            api.endpoints = router
+            elapsed, latencies = run_threads(threads, count, lambda i: api.download_object_data(
+                BUCKET, 'endpoints'))
+            share = dict((hosts[e['host']], {'requests': e['requests'], 'errors': e['errors'],
+                                             'ejections': e['ejections']})
+                         for e in router.stats())
+            run = dict(latency_summary(latencies), name=name, ops_per_sec=count / elapsed,
+                       endpoints=share)
+            run.update(request_counts(metrics))
+            result['runs'].append(run)
+    finally:
+        slow.stop()
+        flaky.stop()
+    return result
+
+
+def copy(server, options):
+    size = (64 if options.quick else 512) * MB
+    data = os.urandom(MB) * (size // MB)
+    server.store.put(BUCKET, 'copy/source', data)
+    del data
+    # each copy request inside the service runs at its disk speed, not the
+    # speed of the client link
+    server.config.copy_bandwidth = 256 * MB
+    result = {'object_size': size, 'runs': []}
+    runs = (
+        ('download_upload', lambda api: api.storing_object_data(
+            BUCKET, 'copy/download_upload', api.download_object_data(BUCKET, 'copy/source'),
+            'string')),
+        ('copy_object', lambda api: api.copy(BUCKET, 'copy/source', BUCKET, 'copy/copy_object')),
+        ('multipart_copy_1', lambda api: api.copy(
+            BUCKET, 'copy/source', BUCKET, 'copy/multipart_copy_1', multipart_threshold=0,
+            part_size=8 * MB, workers=1)),
+        ('multipart_copy_8', lambda api: api.copy(
+            BUCKET, 'copy/source', BUCKET, 'copy/multipart_copy_8', multipart_threshold=0,
+            part_size=8 * MB, workers=8)),
+    )
+    try:
+        for name, fn in runs:
+            api, metrics = create_api(server)
+            start = time.time()
+            fn(api)
+            elapsed = time.time() - start
+            snapshot = metrics.snapshot()
+            run = dict(request_counts(metrics), name=name, seconds=elapsed,
+                       client_bytes=snapshot['bytes_received'] + snapshot['bytes_sent'])
+            result['runs'].append(run)
+            assert (server.store.get(BUCKET, 'copy/' + name)[0] ==
+                    server.store.get(BUCKET, 'copy/source')[0])
+        # moving an object onto itself must neither succeed nor lose it
+        api, metrics = create_api(server)
+        for threshold in (MAX_PART_SIZE, 0):
+            try:
+                api.move(BUCKET, 'copy/source', BUCKET, 'copy/source',
+                         {'content_type': 'text/plain'}, multipart_threshold=threshold)
+            except ProductAPIError:
+                pass
+            else:
+                raise AssertionError('move onto itself succeeded')
+            assert server.store.get(BUCKET, 'copy/source') is not None
+    finally:
+        server.config.copy_bandwidth = None
+        for key in server.store.keys(BUCKET, 'copy/', ''):
+            server.store.delete(BUCKET, key)
+    return result
+
+
+def multipart_keys(server, options):
+    # these keys are only stored under their own name when every multipart
+    # request quotes them
+    keys = ('keys/with space.bin', 'keys/\xe5\x88\x86\xe6\xae\xb5 \xc3\xa9.bin', 'keys/a+b&c=d.bin')
+    size = 2 * MIN_PART_SIZE + MB
+    path = make_file(size)
+    with open(path, 'rb') as f:
+        data = f.read()
+    result = {'object_size': size, 'keys': len(keys)}
+    try:
+        api, metrics = create_api(server)
+        start = time.time()
+        for key in keys:
+            api.upload_big_data(BUCKET, key, path, {}, part_size=MIN_PART_SIZE, workers=4)
+            assert server.store.get(BUCKET, key)[0] == data, key
+            api.copy(BUCKET, key, BUCKET, key + '.copy', multipart_threshold=0,
+                     part_size=MIN_PART_SIZE)
+            assert server.store.get(BUCKET, key + '.copy')[0] == data, key
+            upload_id = api.initiate_multipart_upload(BUCKET, key)
+            api.upload_part(BUCKET, key, 'x' * 1024, 1, upload_id)
+            assert api.list_parts(BUCKET, key, upload_id).keys() == [1], key
+            api.abort_multipart_upload(BUCKET, key, upload_id)
+            assert upload_id not in server.store.uploads, key
+        result['seconds'] = time.time() - start
+        result.update(request_counts(metrics))
+    finally:
+        os.remove(path)
+        for key in server.store.keys(BUCKET, 'keys/', ''):
+            server.store.delete(BUCKET, key)
+    return result
+
+
+def journal_resume(server, options):
+    parts = 4 if options.quick else 16
+    failed_part = parts - 1
+    directory = tempfile.mkdtemp(prefix='speedycloud-bench-\xe6\x97\xa5\xe5\xbf\x97-')
+    path = os.path.join(directory, '\xe5\xa4\xa7 file.bin')
+    journal_path = os.path.join(directory, 'journal.json')
+    key = 'journal/\xe6\x97\xa5\xe5\xbf\x97 k.bin'
+    os.rename(make_file(parts * MIN_PART_SIZE), path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    result = {'object_size': len(data), 'parts': parts}
+    api, metrics = create_api(server)
+    upload_part = api.upload_part
+    interrupt = [True]
+    sent = []
+
+    def counted_upload_part(bucket, key, update_data, part_number, upload_id):
+        if interrupt[0] and part_number == failed_part:
+            raise IOError('connection lost')
+        sent.append(part_number)
+        return upload_part(bucket, key, update_data, part_number, upload_id)
+
+    api.upload_part = counted_upload_part
+    try:
+        for name in ('resume', 'changed_file'):
+            interrupt[0] = True
+            try:
+                api.upload_big_data(BUCKET, key, path, {}, part_size=MIN_PART_SIZE, workers=1,
+                                    journal_path=journal_path)
+            except IOError:
+                pass
+            else:
+                raise AssertionError('interrupted upload succeeded')
+            assert os.path.exists(journal_path)
+            if name == 'changed_file':
+                # a modified file must not be completed from the old parts
+                with open(path, 'ab') as f:
+                    f.write('more')
+                data += 'more'
+            interrupt[0] = False
+            del sent[:]
+            start = time.time()
+            api.upload_big_data(BUCKET, key, path, {}, part_size=MIN_PART_SIZE, workers=2,
+                                journal_path=journal_path)
+            result[name] = {'seconds': time.time() - start, 'parts_sent': len(sent)}
+            assert server.store.get(BUCKET, key)[0] == data, name
+            assert not os.path.exists(journal_path), name
+            assert not server.store.uploads, server.store.uploads.keys()
+        # resuming sends the failed part and the ones after it, a changed file
+        # is uploaded again from scratch, with one more part for the appended bytes
+        assert result['resume']['parts_sent'] == parts - failed_part + 1, result
+        assert result['changed_file']['parts_sent'] == parts + 1, result
+        result.update(request_counts(metrics))
+    finally:
+        shutil.rmtree(directory)
+        server.store.delete(BUCKET, key)
+    return result
+
+
+def fetch(method, url, body=None, headers=None):
+    """
+    不经过 SDK 直接发送请求（例如使用预签名 URL），返回 (状态码, 响应内容)
+    """
+    conn = httplib.HTTPConnection(url.netloc)
+    try:
+        conn.request(method, '%s?%s' % (url.path, url.query), body, headers or {})
+        resp = conn.getresponse()
+        return resp.status, resp.read()
+    finally:
+        conn.close()
+
+
+def async_api(server, options):
+    count = 200 if options.quick else 2000
+    concurrency = 16
+    data = os.urandom(4 * 1024)
+    result = {'objects': count, 'concurrency': concurrency}
+    api = AsyncObjectStorageAPI('BENCH-ACCESS-KEY', 'BENCH-SECRET-KEY', concurrency=concurrency,
+                                host=server.host)
+    metrics = MetricsCollector()
+    metrics.install(api.api)
+    try:
+        start = time.time()
+        gather([api.storing_object_data(BUCKET, 'async/%06d' % i, data, 'string')
+                for i in xrange(count)])
+        result['put_ops_per_sec'] = count / (time.time() - start)
+        start = time.time()
+        bodies = gather([api.download_object_data(BUCKET, 'async/%06d' % i)
+                         for i in xrange(count)])
+        result['get_ops_per_sec'] = count / (time.time() - start)
+        assert bodies == [data] * count
+        # errors are raised by result(), not when the request is submitted
+        future = api.copy_object(BUCKET, 'async/missing', BUCKET, 'async/copy')
+        if not isinstance(future.exception(), ProductAPIError):
+            raise AssertionError('copying a missing object succeeded')
+        result.update(request_counts(metrics))
+        assert api.api.pool.stats()['size'] <= concurrency
+    finally:
+        api.close()
+        for key in server.store.keys(BUCKET, 'async/', ''):
+            server.store.delete(BUCKET, key)
+    # close() waits for the requests and releases the dedicated connections
+    assert api.api.pool.stats()['size'] == 0, api.api.pool.stats()
+    return result
+
+
+def presigned(server, options):
+    count = 10000 if options.quick else 100000
+    key = 'presigned/a b \xc3\xa9.txt'
+    data = os.urandom(4 * 1024)
+    api, metrics = create_api(server)
+    start = time.time()
+    for i in xrange(count):
+        api.presigned_get_url(BUCKET, key)
+    result = {'urls_per_sec': count / (time.time() - start)}
+    # the URLs are used without the SDK, injected errors would not be retried
+    error_rate, server.config.error_rate = server.config.error_rate, 0
+    try:
+        now = int(time.time())
+        url = urlparse.urlsplit(api.presigned_put_url(
+            BUCKET, key, expires_in=600, header_params={'content_type': 'text/plain'}))
+        query = dict(urlparse.parse_qsl(url.query))
+        assert now + 600 <= int(query['Expires']) <= int(time.time()) + 600, query
+        # the signature covers the quoted path the URL points at
+        assert query['Signature'] == api.create_sign(
+            'PUT', url.path, {'content_type': 'text/plain'}, query['Expires']), query
+        status, body = fetch('PUT', url, data, {'Content-Type': 'text/plain'})
+        assert status == 200, (status, body)
+        assert server.store.get(BUCKET, key)[0] == data
+
+        status, body = fetch('GET', urlparse.urlsplit(api.presigned_get_url(BUCKET, key)))
+        assert (status, body) == (200, data), status
+
+        upload_id = api.initiate_multipart_upload(BUCKET, key)
+        status, body = fetch('PUT', urlparse.urlsplit(
+            api.presigned_upload_part_url(BUCKET, key, 1, upload_id)), data)
+        assert status == 200, (status, body)
+        assert api.list_parts(BUCKET, key, upload_id)[1][0].strip('"') == hashlib.md5(
+            data).hexdigest()
+        api.abort_multipart_upload(BUCKET, key, upload_id)
+    finally:
+        server.config.error_rate = error_rate
+        server.store.delete(BUCKET, key)
+    result.update(request_counts(metrics))
+    return result
+
+
+def caches(server, options):
+    count = 200 if options.quick else 2000
+    size = 256 * 1024
+    directory = tempfile.mkdtemp(prefix='speedycloud-bench-')
+    for i in xrange(count):
+        server.store.put(BUCKET, 'caches/%06d' % i, 'x')
+    result = {'objects': count}
+    try:
+        for name, cache in (('lru', LRUCache()),
+                            ('disk', DiskCache(os.path.join(directory, 'metadata')))):
+            api, metrics = create_api(server)
+            api.cache = cache
+            start = time.time()
+            listing = api.list(BUCKET, 'caches/')
+            miss_seconds = time.time() - start
+            requests = metrics.snapshot()['requests']
+            start = time.time()
+            assert api.list(BUCKET, 'caches/') == listing
+            hit_seconds = time.time() - start
+            assert metrics.snapshot()['requests'] == requests, 'cached listing was requested'
+            # a write through the same client invalidates the listing
+            api.storing_object_data(BUCKET, 'caches/new', 'x', 'string')
+            assert 'caches/new' in api.list(BUCKET, 'caches/')
+            api.delete_object_data(BUCKET, 'caches/new')
+            assert 'caches/new' not in api.list(BUCKET, 'caches/')
+            result[name] = dict(request_counts(metrics), miss_seconds=miss_seconds,
+                                hit_seconds=hit_seconds)
+
+        # only one object fits next to the newest one, the least recently used
+        # one is evicted
+        download_cache = DownloadCache(os.path.join(directory, 'objects'),
+                                       max_bytes=size * 3 // 2)
+        api, metrics = create_api(server)
+        api.download_cache = download_cache
+        contents = {}
+        for i in xrange(3):
+            contents['caches/large-%d' % i] = os.urandom(size)
+            server.store.put(BUCKET, 'caches/large-%d' % i, contents['caches/large-%d' % i])
+        for key in sorted(contents):
+            assert download_cache.get(api, BUCKET, key)[:] == contents[key], key
+        assert download_cache.lookup(BUCKET, 'caches/large-0') == (None, None)
+        received = metrics.snapshot()['bytes_received']
+        start = time.time()
+        assert api.download_object_cached(BUCKET, 'caches/large-2')[:] == contents[
+            'caches/large-2']
+        hit_seconds = time.time() - start
+        # a hit is confirmed with a 304, the content is not sent again
+        assert metrics.snapshot()['bytes_received'] - received < size
+        contents['caches/large-2'] = os.urandom(size)
+        server.store.put(BUCKET, 'caches/large-2', contents['caches/large-2'])
+        assert api.download_object_cached(BUCKET, 'caches/large-2')[:] == contents[
+            'caches/large-2']
+        result['download'] = dict(request_counts(metrics), hit_seconds=hit_seconds)
+    finally:
+        shutil.rmtree(directory)
+        for key in server.store.keys(BUCKET, 'caches/', ''):
+            server.store.delete(BUCKET, key)
+    return result
+
+
+def transfer_manager(server, options):
+    count = 50 if options.quick else 500
+    local = tempfile.mkdtemp(prefix='speedycloud-bench-')
+    target = tempfile.mkdtemp(prefix='speedycloud-bench-')
+    files = {}
+    for i in xrange(count):
+        files['small/%04d.bin' % i] = os.urandom(16 * 1024)
+    files['\xe7\x9b\xae\xe5\xbd\x95/\xe6\x96\x87\xe4\xbb\xb6 a.txt'] = 'hello ' * 1024
+    files['large.bin'] = os.urandom(2 * MIN_PART_SIZE + MB)
+    for name, data in files.items():
+        path = os.path.join(local, *name.split('/'))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(data)
+        # older than the LastModified the fake server reports, so unchanged
+        # files are skipped on size and time alone
+        os.utime(path, (0, 0))
+    result = {'files': len(files)}
+    try:
+        api, metrics = create_api(server)
+        # stored as is, or the next run would see a different size and ETag
+        api.compression = Compression(min_size=0)
+        manager = TransferManager(api, workers=8, multipart_threshold=MIN_PART_SIZE,
+                                  part_size=MIN_PART_SIZE, bandwidth=1024 * MB)
+        assert api.rate_limiter is None, 'the bandwidth limit leaked into the client'
+        for name, fn in (('upload', lambda: manager.upload_dir(local, BUCKET, 'sync/')),
+                         ('download', lambda: manager.download_dir(BUCKET, 'sync/', target))):
+            start = time.time()
+            transferred = fn()
+            elapsed = time.time() - start
+            assert not transferred['errors'], transferred['errors']
+            assert len(transferred['transferred']) == len(files), transferred
+            again = fn()
+            assert (again['skipped'], again['transferred']) == (len(files), []), again
+            result[name] = {'seconds': elapsed}
+        for name, data in files.items():
+            assert server.store.get(BUCKET, 'sync/' + name)[0] == data, name
+            assert not server.store.encodings[(BUCKET, 'sync/' + name)], name
+            with open(os.path.join(target, *name.split('/')), 'rb') as f:
+                assert f.read() == data, name
+        # an object key must not write outside the target directory
+        server.store.put(BUCKET, 'sync/../escaped.txt', 'x')
+        outcome = manager.download_dir(BUCKET, 'sync/', target)
+        assert outcome['errors'].keys() == ['sync/../escaped.txt'], outcome
+        assert not os.path.exists(os.path.join(os.path.dirname(target), 'escaped.txt'))
+        result.update(request_counts(metrics))
+    finally:
+        shutil.rmtree(local)
+        shutil.rmtree(target)
+        for key in server.store.keys(BUCKET, 'sync/', ''):
+            server.store.delete(BUCKET, key)
+    return result
+
+
+def retries(server, options):
+    count = 200 if options.quick else 2000
+    data = os.urandom(1024)
+    error_rate = server.config.error_rate
+    result = {'requests': count}
+    try:
+        # every request succeeds eventually while the budget lasts
+        server.config.error_rate = 0.2
+        api, metrics = create_api(server)
+        api.retry_policy = RetryPolicy(max_attempts=10, base_delay=0.001,
+                                       budget=RetryBudget(capacity=count))
+        start = time.time()
+        for i in xrange(count):
+            api.storing_object_data(BUCKET, 'retries/%06d' % i, data, 'string')
+        for i in xrange(count):
+            assert api.download_object_data(BUCKET, 'retries/%06d' % i) == data, i
+        result['flaky'] = dict(request_counts(metrics), seconds=time.time() - start)
+        assert result['flaky']['retries'] > 0, result
+
+        # with the server down, the budget caps retries across all requests
+        server.config.error_rate = 1
+        api, metrics = create_api(server)
+        api.retry_policy = RetryPolicy(max_attempts=5, base_delay=0.001,
+                                       budget=RetryBudget(capacity=10, refill=0))
+        for i in xrange(10):
+            try:
+                api.head_object(BUCKET, 'retries/%06d' % i)
+            except ProductAPIError:
+                pass
+        result['outage'] = request_counts(metrics)
+        assert result['outage']['retries'] == 10, result
+        assert result['outage']['requests'] == 20, result
+    finally:
+        server.config.error_rate = error_rate
+        for key in server.store.keys(BUCKET, 'retries/', ''):
+            server.store.delete(BUCKET, key)
+    return result
+
+
+def integrity(server, options):
+    size = (8 if options.quick else 64) * MB
+    data = os.urandom(MB) * (size // MB)
+    server.store.put(BUCKET, 'integrity/good', data)
+    # served with the ETag of other content, as if corrupted in transit
+    server.store.put(BUCKET, 'integrity/bad', data, '"%s"' % hashlib.md5('other').hexdigest())
+    directory = tempfile.mkdtemp(prefix='speedycloud-bench-')
+    result = {'object_size': size}
+    try:
+        for verify in (True, False):
+            api, metrics = create_api(server)
+            api.verify_integrity = verify
+            start = time.time()
+            out = StringIO()
+            api.download_object_to_file(BUCKET, 'integrity/good', out)
+            elapsed = time.time() - start
+            assert out.getvalue() == data
+            result['verify' if verify else 'no_verify'] = {
+                'seconds': elapsed, 'mb_per_sec': size / elapsed / MB}
+
+        api, metrics = create_api(server)
+        download_cache = DownloadCache(directory)
+        checks = (
+            ('download_object_to_file', lambda: api.download_object_to_file(
+                BUCKET, 'integrity/bad', StringIO())),
+            ('download_cache', lambda: download_cache.get(api, BUCKET, 'integrity/bad')),
+        )
+        for name, fn in checks:
+            try:
+                fn()
+            except IntegrityError:
+                pass
+            else:
+                raise AssertionError('%s accepted corrupted data' % name)
+            # the response is closed and its connection goes back to the pool
+            assert api.pool.stats()['in_use'] == 0, name
+        assert download_cache.lookup(BUCKET, 'integrity/bad') == (None, None)
+        result.update(request_counts(metrics))
+    finally:
+        shutil.rmtree(directory)
+        for key in server.store.keys(BUCKET, 'integrity/', ''):
+            server.store.delete(BUCKET, key)
+    return result
+
+
+def make_file(size):
+    fd, path = tempfile.mkstemp(prefix='speedycloud-bench-')
+    block = os.urandom(MB)
+    with os.fdopen(fd, 'wb') as f:
+        for _ in xrange(size // MB):
+            f.write(block)
+        f.write(block[:size % MB])
+    return path
+
+
+def make_json_file(records):
+    fd, path = tempfile.mkstemp(prefix='speedycloud-bench-', suffix='.json')
+    rand = random.Random(0)
+    with os.fdopen(fd, 'wb') as f:
+        for i in xrange(records):
+            f.write(json.dumps({'id': i, 'user': 'user-%d' % rand.randint(0, 1000),
+                                'event': rand.choice(['view', 'click', 'purchase']),
+                                'value': rand.random()}) + '\n')
+    return path
+
+
+SCENARIOS = (
+    ('small_objects', small_objects),
+    ('large_object', large_object),
+    ('listing', listing),
+    ('multipart', multipart),
+    ('compression', compression),
+    ('pool_contention', pool_contention),
+    ('endpoints', endpoints),
+    ('copy', copy),
+    ('multipart_keys', multipart_keys),
+    ('journal_resume', journal_resume),
+    ('async_api', async_api),
+    ('presigned', presigned),
+    ('caches', caches),
+    ('transfer_manager', transfer_manager),
+    ('retries', retries),
+    ('integrity', integrity),
+)
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('--scenario', action='append', dest='scenarios',
+                      choices=[name for name, fn in SCENARIOS],
+                      help='scenario to run, may be repeated (default: all)')
+    parser.add_option('--latency', type='float', default=0,
+                      help='server side delay per request in seconds')
+    parser.add_option('--bandwidth', type='int', default=None,
+                      help='per connection bandwidth limit in bytes per second')
+    parser.add_option('--error-rate', type='float', default=0,
+                      help='probability of a 503 SlowDown response')
+    parser.add_option('--seed', type='int', default=0)
+    parser.add_option('--quick', action='store_true', default=False,
+                      help='smaller data sets for a fast smoke run')
+    parser.add_option('--output', help='write the JSON result to this file')
+    options, args = parser.parse_args()
+
+    random.seed(options.seed)
+    config = ServerConfig(latency=options.latency, bandwidth=options.bandwidth,
+                          error_rate=options.error_rate, seed=options.seed)
+    server = FakeObjectStorage(config)
+    server.start()
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {'latency': options.latency, 'bandwidth': options.bandwidth,
+                   'error_rate': options.error_rate, 'seed': options.seed,
+                   'quick': options.quick},
+        'results': {},
+    }
+    try:
+        for name, fn in SCENARIOS:
+            if options.scenarios and name not in options.scenarios:
+                continue
+            server.reset_counts()
+            report['results'][name] = fn(server, options)
+            report['results'][name]['server_requests'] = server.reset_counts()
+    finally:
+        server.stop()
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(output + '\n')
+    print output
+
+
+if __name__ == '__main__':
+    main()
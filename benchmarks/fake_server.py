@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+"""
+进程内的对象存储模拟服务，供基准测试使用
+支持对象的 PUT/GET/HEAD/DELETE（含 Range）、分页列表、分段上传，
+可配置每个请求的延迟、带宽上限和随机错误（503 SlowDown）
+签名不做校验
+"""
+
+import re
+import time
+import random
+import socket
+import urllib
+import hashlib
+import threading
+import urlparse
+import BaseHTTPServer
+import SocketServer
+from xml.sax.saxutils import escape
+
+S3_NS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+CHUNK_SIZE = 64 * 1024
+LAST_MODIFIED = '2018-06-21T10:00:00.000Z'
+
+
+class ServerConfig(object):
+    """
+    模拟服务的行为配置，运行中可以修改
+    参数:
+        latency: 每个请求在响应前的延迟（秒）
+        bandwidth: 每个连接的收发带宽上限（字节/秒），None 表示不限速
+        error_rate: 随机返回 503 的概率
+        seed: 错误注入的随机种子，保证结果可重复
+        copy_bandwidth: 服务端复制对象的速度（字节/秒），None 表示不限速
+    """
+
+    def __init__(self, latency=0, bandwidth=None, error_rate=0, seed=0, copy_bandwidth=None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.copy_bandwidth = copy_bandwidth
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def inject_error(self):
+        if not self.error_rate:
+            return False
+        self.lock.acquire()
+        try:
+            return self.random.random() < self.error_rate
+        finally:
+            self.lock.release()
+
+
+class Store(object):
+    """
+    内存中的桶和分段上传
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects = {}
+        self.encodings = {}
+        self.metadata = {}
+        self.uploads = {}
+        self.upload_count = 0
+
+    def put(self, bucket, key, data, etag=None, encoding=None, metadata=None):
+        if etag is None:
+            etag = '"%s"' % hashlib.md5(data).hexdigest()
+        self.lock.acquire()
+        try:
+            self.objects[(bucket, key)] = (data, etag)
+            self.encodings[(bucket, key)] = encoding
+            self.metadata[(bucket, key)] = metadata or {}
+        finally:
+            self.lock.release()
+        return etag
+
+    def get(self, bucket, key):
+        return self.objects.get((bucket, key))
+
+    def delete(self, bucket, key):
+        self.lock.acquire()
+        try:
+            self.objects.pop((bucket, key), None)
+            self.encodings.pop((bucket, key), None)
+            self.metadata.pop((bucket, key), None)
+        finally:
+            self.lock.release()
+
+    def keys(self, bucket, prefix, marker):
+        self.lock.acquire()
+        try:
+            return sorted(k for b, k in self.objects
+                          if b == bucket and k.startswith(prefix) and k > marker)
+        finally:
+            self.lock.release()
+
+    def create_upload(self):
+        self.lock.acquire()
+        try:
+            self.upload_count += 1
+            upload_id = 'upload-%d' % self.upload_count
+            self.uploads[upload_id] = {}
+            return upload_id
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.objects.clear()
+            self.encodings.clear()
+            self.metadata.clear()
+            self.uploads.clear()
+        finally:
+            self.lock.release()
+
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _throttle(self, size, start):
+        bandwidth = self.server.config.bandwidth
+        if bandwidth:
+            delay = start + float(size) / bandwidth - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    def _read_chunked(self):
+        chunks = []
+        start = time.time()
+        received = 0
+        while True:
+            size = int(self.rfile.readline().split(';')[0], 16)
+            if size == 0:
+                self.rfile.readline()
+                return ''.join(chunks)
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+            received += size
+            self._throttle(received, start)
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            return self._read_chunked()
+        length = int(self.headers.get('Content-Length') or 0)
+        chunks = []
+        start = time.time()
+        received = 0
+        while received < length:
+            chunk = self.rfile.read(min(CHUNK_SIZE, length - received))
+            if not chunk:
+                break
+            chunks.append(chunk)
+            received += len(chunk)
+            self._throttle(received, start)
+        return ''.join(chunks)
+
+    def _send(self, status, body='', headers=None, length=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body) if length is None else length))
+        self.end_headers()
+        if self.command == 'HEAD' or not body:
+            return
+        start = time.time()
+        for offset in xrange(0, len(body), CHUNK_SIZE):
+            self.wfile.write(body[offset:offset + CHUNK_SIZE])
+            self._throttle(offset + CHUNK_SIZE, start)
+
+    def _send_xml(self, status, body):
+        self._send(status, '<?xml version="1.0" encoding="UTF-8"?>\n' + body,
+                   {'Content-Type': 'application/xml'})
+
+    def _error(self, status, code):
+        self._send_xml(status, '<Error><Code>%s</Code></Error>' % code)
+
+    def _copy_source(self):
+        """
+        读取 x-amz-copy-source 指向的数据（按 x-amz-copy-source-range 截取），
+        源对象不存在或 ETag 不匹配时返回 (None, 错误状态码, 错误码)
+        """
+        source = urllib.unquote(self.headers['x-amz-copy-source']).lstrip('/')
+        bucket, _, key = source.partition('/')
+        item = self.server.store.get(bucket, key)
+        if item is None:
+            return None, 404, 'NoSuchKey'
+        target = urllib.unquote(urlparse.urlparse(self.path).path).lstrip('/')
+        if (source == target and 'uploadId' not in self.path and
+                self.headers.get('x-amz-metadata-directive') != 'REPLACE'):
+            # like S3, copying an object onto itself must change its metadata
+            return None, 400, 'InvalidRequest'
+        data, etag = item
+        if self.headers.get('x-amz-copy-source-if-match') not in (None, etag):
+            return None, 412, 'PreconditionFailed'
+        match = re.match(r'bytes=(\d+)-(\d+)$',
+                         self.headers.get('x-amz-copy-source-range') or '')
+        if match:
+            data = data[int(match.group(1)):int(match.group(2)) + 1]
+        copy_bandwidth = self.server.config.copy_bandwidth
+        if copy_bandwidth:
+            time.sleep(float(len(data)) / copy_bandwidth)
+        return data, None, None
+
+    def handle_request(self):
+        config = self.server.config
+        url = urlparse.urlparse(self.path)
+        parts = url.path.lstrip('/').split('/', 1)
+        bucket = parts[0]
+        key = urllib.unquote(parts[1]) if len(parts) > 1 and parts[1] else None
+        query = dict((k, v[0]) for k, v in
+                     urlparse.parse_qs(url.query, keep_blank_values=True).items())
+        body = self._read_body()
+        self.server.record(self.command)
+        if config.latency:
+            time.sleep(config.latency)
+        if config.inject_error():
+            return self._error(503, 'SlowDown')
+        if key is None:
+            return self._bucket(bucket, query)
+        return self._object(bucket, key, query, body)
+
+    do_GET = do_PUT = do_POST = do_DELETE = do_HEAD = handle_request
+
+    def _bucket(self, bucket, query):
+        if self.command != 'GET' or set(query) & set(['acl', 'versioning', 'versions']):
+            return self._send_xml(200, '<Result/>')
+        prefix = query.get('prefix', '')
+        marker = query.get('marker', '')
+        max_keys = int(query.get('max-keys', '1000'))
+        keys = self.server.store.keys(bucket, prefix, marker)
+        page = keys[:max_keys]
+        contents = []
+        for key in page:
+            item = self.server.store.get(bucket, key)
+            if item is None:
+                continue
+            contents.append(
+                '<Contents><Key>%s</Key><LastModified>%s</LastModified><ETag>%s</ETag>'
+                '<Size>%d</Size><StorageClass>STANDARD</StorageClass></Contents>' % (
+                    escape(key), LAST_MODIFIED, escape(item[1]), len(item[0])))
+        self._send_xml(200, (
+            '<ListBucketResult xmlns="%s"><Name>%s</Name><Prefix>%s</Prefix>'
+            '<Marker>%s</Marker><MaxKeys>%d</MaxKeys><IsTruncated>%s</IsTruncated>%s'
+            '</ListBucketResult>') % (
+                S3_NS, escape(bucket), escape(prefix), escape(marker), max_keys,
+                'true' if len(keys) > max_keys else 'false', ''.join(contents)))
+
+    def _object(self, bucket, key, query, body):
+        store = self.server.store
+        method = self.command
+        if 'uploads' in query and method == 'POST':
+            return self._send_xml(200, (
+                '<InitiateMultipartUploadResult xmlns="%s"><Bucket>%s</Bucket><Key>%s</Key>'
+                '<UploadId>%s</UploadId></InitiateMultipartUploadResult>') % (
+                    S3_NS, escape(bucket), escape(key), store.create_upload()))
+        if 'uploadId' in query:
+            return self._multipart(bucket, key, query, body)
+        if 'acl' in query:
+            return self._send_xml(200, '<AccessControlPolicy/>')
+        if method == 'PUT' and 'x-amz-copy-source' in self.headers:
+            data, status, code = self._copy_source()
+            if data is None:
+                return self._error(status, code)
+            etag = store.put(bucket, key, data)
+            return self._send_xml(200, (
+                '<CopyObjectResult><LastModified>%s</LastModified><ETag>%s</ETag>'
+                '</CopyObjectResult>') % (LAST_MODIFIED, escape(etag)))
+        if method == 'PUT':
+            metadata = dict((name, value) for name, value in self.headers.items()
+                            if name.startswith('x-amz-meta-'))
+            etag = store.put(bucket, key, body, encoding=self.headers.get('Content-Encoding'),
+                             metadata=metadata)
+            return self._send(200, '', {'ETag': etag})
+        if method == 'DELETE':
+            store.delete(bucket, key)
+            return self._send(204)
+        item = store.get(bucket, key)
+        if item is None:
+            return self._error(404, 'NoSuchKey')
+        data, etag = item
+        headers = {'ETag': etag, 'Accept-Ranges': 'bytes'}
+        if store.encodings.get((bucket, key)):
+            headers['Content-Encoding'] = store.encodings[(bucket, key)]
+        headers.update(store.metadata.get((bucket, key)) or {})
+        if self.headers.get('If-None-Match') == etag:
+            return self._send(304, '', headers)
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range') or '')
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or len(data) - 1), len(data) - 1)
+            headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end, len(data))
+            return self._send(206, data[start:end + 1], headers)
+        return self._send(200, data, headers, length=len(data))
+
+    def _multipart(self, bucket, key, query, body):
+        store = self.server.store
+        parts = store.uploads.get(query['uploadId'])
+        if parts is None:
+            return self._error(404, 'NoSuchUpload')
+        if self.command == 'PUT' and 'x-amz-copy-source' in self.headers:
+            data, status, code = self._copy_source()
+            if data is None:
+                return self._error(status, code)
+            etag = '"%s"' % hashlib.md5(data).hexdigest()
+            parts[int(query['partNumber'])] = (data, etag)
+            return self._send_xml(200, (
+                '<CopyPartResult><LastModified>%s</LastModified><ETag>%s</ETag>'
+                '</CopyPartResult>') % (LAST_MODIFIED, escape(etag)))
+        if self.command == 'PUT':
+            etag = '"%s"' % hashlib.md5(body).hexdigest()
+            parts[int(query['partNumber'])] = (body, etag)
+            return self._send(200, '', {'ETag': etag})
+        if self.command == 'DELETE':
+            store.uploads.pop(query['uploadId'], None)
+            return self._send(204)
+        if self.command == 'GET':
+            items = ''.join(
+                '<Part><PartNumber>%d</PartNumber><ETag>%s</ETag><Size>%d</Size></Part>' % (
+                    number, escape(etag), len(data))
+                for number, (data, etag) in sorted(parts.items()))
+            return self._send_xml(200, (
+                '<ListPartsResult xmlns="%s"><IsTruncated>false</IsTruncated>%s'
+                '</ListPartsResult>') % (S3_NS, items))
+        numbers = [int(n) for n in re.findall(r'<PartNumber>(\d+)</PartNumber>', body)]
+        if numbers != sorted(numbers) or [n for n in numbers if n not in parts]:
+            return self._error(400, 'InvalidPartOrder')
+        data = ''.join(parts[n][0] for n in numbers)
+        digest = hashlib.md5(''.join(hashlib.md5(parts[n][0]).digest() for n in numbers))
+        etag = store.put(bucket, key, data, '"%s-%d"' % (digest.hexdigest(), len(numbers)))
+        store.uploads.pop(query['uploadId'], None)
+        self._send_xml(200, (
+            '<CompleteMultipartUploadResult xmlns="%s"><Bucket>%s</Bucket><Key>%s</Key>'
+            '<ETag>%s</ETag></CompleteMultipartUploadResult>') % (
+                S3_NS, escape(bucket), escape(key), escape(etag)))
+
+
+class FakeObjectStorage(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    模拟服务，监听 127.0.0.1 的随机端口
+    用法:
+        server = FakeObjectStorage(ServerConfig(latency=0.01))
+        server.start()
+        ... 请求 server.host ...
+        server.stop()
+    """
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, config=None):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0), RequestHandler)
+        self.config = config or ServerConfig()
+        self.store = Store()
+        self.counts = {}
+        self.counts_lock = threading.Lock()
+        # open connection -> handler thread
+        self.connections = {}
+        self.thread = None
+
+    @property
+    def host(self):
+        return '%s:%d' % self.server_address
+
+    def record(self, method):
+        self.counts_lock.acquire()
+        try:
+            self.counts[method] = self.counts.get(method, 0) + 1
+        finally:
+            self.counts_lock.release()
+
+    def reset_counts(self):
+        self.counts_lock.acquire()
+        try:
+            counts, self.counts = self.counts, {}
+            return counts
+        finally:
+            self.counts_lock.release()
+
+    def process_request_thread(self, request, client_address):
+        self.counts_lock.acquire()
+        self.connections[request] = threading.current_thread()
+        self.counts_lock.release()
+        try:
+            SocketServer.ThreadingMixIn.process_request_thread(self, request, client_address)
+        finally:
+            self.counts_lock.acquire()
+            self.connections.pop(request, None)
+            self.counts_lock.release()
+
+    def handle_error(self, request, client_address):
+        # clients closing idle keep-alive connections are expected
+        pass
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.setDaemon(True)
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.thread.join()
+        # wake up the handlers blocked on idle keep-alive connections
+        self.counts_lock.acquire()
+        connections = self.connections.items()
+        self.counts_lock.release()
+        for request, thread in connections:
+            try:
+                request.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        for request, thread in connections:
+            thread.join(1)
@@ -1,10 +1,20 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from speedycloud.object_storage import DEFAULT_HOST
 from speedycloud.object_storage.object_storage import ObjectStorageAPI
+from speedycloud.object_storage.async_api import AsyncObjectStorageAPI
 
 
-def create_object_storage_api(access_key, secret_key):
-    # 对象存储
-    object_storage_api = ObjectStorageAPI(access_key, secret_key)
+def create_object_storage_api(access_key, secret_key, host=DEFAULT_HOST, endpoints=None):
+    # 对象存储，endpoints 为 EndpointRouter 时在多个服务地址之间分配请求
+    object_storage_api = ObjectStorageAPI(access_key, secret_key, host=host, endpoints=endpoints)
     return object_storage_api
+
+
+def create_async_object_storage_api(access_key, secret_key, concurrency=64, host=DEFAULT_HOST,
+                                    endpoints=None):
+    # 对象存储（后台线程池执行请求，接口返回 Future）
+    async_object_storage_api = AsyncObjectStorageAPI(
+        access_key, secret_key, concurrency=concurrency, host=host, endpoints=endpoints)
+    return async_object_storage_api
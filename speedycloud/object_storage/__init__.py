@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import collections
+import select
 import urllib
 import httplib
 import hmac
@@ -8,97 +10,291 @@ import socket
 import time
 import threading
 import base64
-from datetime import datetime
+
+from speedycloud.object_storage.hooks import Hooks, operation_name
+from speedycloud.object_storage.retry import RetryBudget, RetryPolicy
+from speedycloud.object_storage.streams import (
+    Response, StreamingResponse, body_length, body_position, is_stream, iter_body, rewind_body)
 
 
 class ProductAPIError(Exception):
     pass
 
 
+DEFAULT_HOST = 'oss-cn-beijing.speedycloud.org'
+
+_DATE_CACHE = (None, None)
+
+# query parameters that belong to the signed resource, the others (prefix,
+# marker, max-keys, ...) are left out of the string to sign
+SIGNED_SUBRESOURCES = frozenset([
+    'acl', 'cors', 'delete', 'lifecycle', 'location', 'logging', 'notification',
+    'partNumber', 'policy', 'requestPayment', 'tagging', 'torrent', 'uploadId', 'uploads',
+    'versionId', 'versioning', 'versions', 'website',
+    'response-cache-control', 'response-content-disposition', 'response-content-encoding',
+    'response-content-language', 'response-content-type', 'response-expires',
+])
+
+
+# not available on Windows, where select() has no descriptor limit
+_poll = getattr(select, 'poll', None)
+
+# request parameters sent as plain HTTP headers
+PARAM_HEADERS = {
+    'content_length': 'Content-Length',
+    'content_type': 'Content-Type',
+    'content_md5': 'Content-MD5',
+    'content_encoding': 'Content-Encoding',
+    'transfer_encoding': 'Transfer-Encoding',
+    'range': 'Range',
+    'if_none_match': 'If-None-Match',
+    'if_modified_since': 'If-Modified-Since',
+}
+
+
+def http_date():
+    """
+    当前时间的 HTTP Date 格式字符串，同一秒内只格式化一次
+    """
+    global _DATE_CACHE
+    now = int(time.time())
+    cached = _DATE_CACHE
+    if cached[0] != now:
+        cached = (now, time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(now)))
+        _DATE_CACHE = cached
+    return cached[1]
+
+
+def canonical_resource(path):
+    """
+    签名使用的资源路径：去掉查询参数中的非子资源部分，子资源按名称排序
+    """
+    if '?' not in path:
+        return path
+    resource, query = path.split('?', 1)
+    subresources = [item for item in query.split('&')
+                    if item.split('=', 1)[0] in SIGNED_SUBRESOURCES]
+    if not subresources:
+        return resource
+    subresources.sort(key=lambda item: item.split('=', 1)[0])
+    return '%s?%s' % (resource, '&'.join(subresources))
+
+
 class ConnectionPool:
-    def __init__(self, host, protocol, size=10):
+    """
+    HTTP 连接池
+    参数:
+        host: 主机名
+        protocol: 'http' 或 'https'
+        size: 保留的连接数，空闲回收时不低于该数量
+        max_size: 连接数上限，连接全部被占用时 get_connection 阻塞等待
+        timeout: 等待空闲连接的超时时间（秒），超时抛出 ProductAPIError，None 表示一直等待
+        max_idle_time: 空闲超过该时间（秒）的连接将被关闭
+    注意：连接在第一次取用时才创建，需要预先创建时调用 initialize()
+    """
+    __INSTANCE_LOCK__ = threading.Lock()
+
+    def __init__(self, host, protocol, size=10, max_size=100, timeout=30, max_idle_time=60):
         self.protocol = protocol
         self.host = host
         self.initial_size = size
-        self.size = size
-        self.connections = {}
+        self.max_size = max(size, max_size)
+        self.timeout = timeout
+        self.max_idle_time = max_idle_time
+        # idle connections as (connection, last used time), most recently
+        # used on the right so checkout and eviction are both O(1)
+        self.idle = collections.deque()
+        self.in_use = set()
+        self.size = 0
         self.lock = threading.Lock()
-        self.initialize()
+        self.available = threading.Condition(self.lock)
+        self.created = 0
+        self.evicted = 0
+        self.stale = 0
+        self.waits = 0
+        self.wait_time = 0.0
 
     def _create_connection(self):
         if self.protocol == 'http':
-            return httplib.HTTPConnection(self.host)
+            conn = httplib.HTTPConnection(self.host)
         elif self.protocol == 'https':
-            return httplib.HTTPSConnection(self.host)
+            conn = httplib.HTTPSConnection(self.host)
         else:
             raise ProductAPIError(
                 'Do not support protocol: %s' % self.protocol)
+        self.created += 1
+        self.size += 1
+        return conn
 
     def initialize(self):
-        for i in range(self.size):
-            conn = self._create_connection()
-            self.connections[conn] = False
-
-    def get_connection(self):
+        """
+        预先创建 size 个连接
+        """
         self.lock.acquire()
         try:
-            for c, used in self.connections.items():
-                if not used:
-                    self.connections[c] = True
-                    return c
-            # If we got there, we should expand this pool
-            new_conn = self._create_connection()
-            self.connections[new_conn] = True
-            self.size += 1
-            return new_conn
+            now = time.time()
+            while self.size < self.initial_size:
+                self.idle.append((self._create_connection(), now))
         finally:
             self.lock.release()
 
+    def get_connection(self, timeout=-1):
+        if timeout == -1:
+            timeout = self.timeout
+        self.available.acquire()
+        try:
+            start = None
+            while True:
+                self.__evict_idle()
+                if self.idle:
+                    conn = self.idle.pop()[0]
+                    if not self._is_alive(conn):
+                        # the server closed this keep-alive socket, httplib
+                        # opens a new one on the next request
+                        conn.close()
+                        self.stale += 1
+                    break
+                if self.size < self.max_size:
+                    conn = self._create_connection()
+                    break
+                now = time.time()
+                if start is None:
+                    start = now
+                    self.waits += 1
+                if timeout is None:
+                    self.available.wait()
+                    continue
+                remaining = timeout - (now - start)
+                if remaining <= 0:
+                    self.wait_time += now - start
+                    raise ProductAPIError(
+                        'no free connection to %s after %s seconds' % (self.host, timeout))
+                self.available.wait(remaining)
+            if start is not None:
+                self.wait_time += time.time() - start
+            self.in_use.add(conn)
+            return conn
+        finally:
+            self.available.release()
+
     def put_connection(self, connection):
+        self.available.acquire()
+        try:
+            if connection not in self.in_use:
+                return
+            self.in_use.remove(connection)
+            self.idle.append((connection, time.time()))
+            self.available.notify()
+        finally:
+            self.available.release()
+
+    def __evict_idle(self):
+        deadline = time.time() - self.max_idle_time
+        while self.idle and self.idle[0][1] < deadline and self.size > self.initial_size:
+            conn = self.idle.popleft()[0]
+            conn.close()
+            self.size -= 1
+            self.evicted += 1
+
+    @staticmethod
+    def _is_alive(connection):
+        sock = connection.sock
+        if sock is None:
+            return True
+        try:
+            # an idle keep-alive socket should have nothing to read, readable
+            # means the peer closed it or sent garbage
+            if _poll is not None:
+                # select() can not watch descriptors >= FD_SETSIZE (1024)
+                poller = _poll()
+                poller.register(sock, select.POLLIN | select.POLLPRI)
+                return not poller.poll(0)
+            readable = select.select([sock], [], [], 0)[0]
+        except (select.error, socket.error, ValueError):
+            return False
+        return not readable
+
+    def stats(self):
+        """
+        连接池统计信息
+        """
         self.lock.acquire()
         try:
-            self.connections[connection] = False
-            self.__clean()
+            return {
+                'size': self.size,
+                'in_use': len(self.in_use),
+                'idle': len(self.idle),
+                'created': self.created,
+                'evicted': self.evicted,
+                'stale': self.stale,
+                'waits': self.waits,
+                'wait_time': self.wait_time,
+            }
         finally:
             self.lock.release()
 
-    def __clean(self):
-        need_clean = len(self.connections) - self.initial_size
-        if need_clean > 0:
-            cleaned = need_clean
-            for c, used in self.connections.items():
-                if cleaned <= 0:
-                    break
-                if not used:
-                    c.close()
-                    del self.connections[c]
-                    cleaned -= 1
-                    self.size -= 1
-
     @staticmethod
     def reconnect(connection):
         connection.close()
 
+    def close(self):
+        """
+        关闭全部空闲连接，正在使用的连接归还后仍可复用
+        """
+        self.lock.acquire()
+        try:
+            while self.idle:
+                self.idle.popleft()[0].close()
+                self.size -= 1
+        finally:
+            self.lock.release()
+
     @classmethod
-    def get_instance(cls, host, protocol, size=10):
-        if not hasattr(cls, "__POOL_INSTANCE__"):
-            cls.__POOL_INSTANCE__ = {}
-        cache_key = "%s-%s" % (host, protocol)
-        if cache_key not in cls.__POOL_INSTANCE__:
-            cls.__POOL_INSTANCE__[cache_key] = ConnectionPool(
-                host, protocol, size)
-        return cls.__POOL_INSTANCE__[cache_key]
+    def get_instance(cls, host, protocol, size=10, **kwargs):
+        cls.__INSTANCE_LOCK__.acquire()
+        try:
+            if not hasattr(cls, "__POOL_INSTANCE__"):
+                cls.__POOL_INSTANCE__ = {}
+            cache_key = "%s-%s" % (host, protocol)
+            if cache_key not in cls.__POOL_INSTANCE__:
+                cls.__POOL_INSTANCE__[cache_key] = ConnectionPool(
+                    host, protocol, size, **kwargs)
+            return cls.__POOL_INSTANCE__[cache_key]
+        finally:
+            cls.__INSTANCE_LOCK__.release()
 
 
 class AbstractProductAPI(object):
-    def __init__(self, access_key, secret_key, protocol='http'):
-        self.host = 'oss-cn-beijing.speedycloud.org'
+    def __init__(self, access_key, secret_key, protocol='http', retry_policy=None,
+                 host=DEFAULT_HOST, endpoints=None):
+        self.host = host
         self.access_key = access_key
         self.secret_key = secret_key
         self.protocol = protocol
-        self.response_header = []
-        self.pool = ConnectionPool.get_instance(
-            self.host, protocol)
+        if retry_policy is None:
+            retry_policy = RetryPolicy(budget=RetryBudget())
+        self.retry_policy = retry_policy
+        self._hmac = None
+        # optional RateLimiter shared by every request body and streamed
+        # response of this client
+        self.rate_limiter = None
+        self.hooks = Hooks()
+        self._pool = None
+        # optional EndpointRouter, when set requests are spread over its
+        # endpoints and host/pool are not used
+        self.endpoints = endpoints
+
+    def _get_pool(self):
+        # looked up on first use, so creating a client costs nothing and a
+        # host changed after construction still gets its own pool
+        if self._pool is None:
+            self._pool = ConnectionPool.get_instance(self.host, self.protocol)
+        return self._pool
+
+    def _set_pool(self, pool):
+        self._pool = pool
+
+    pool = property(_get_pool, _set_pool)
 
     @staticmethod
     def _encode_params(params):
@@ -107,43 +303,94 @@ class AbstractProductAPI(object):
         return urllib.urlencode(params)
 
     def _generate_headers(self, method, path, params):
-        if "?prefix" in path:
-            path = path.split("?prefix")[0]
-        request_date = datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT')
-        sign = self.create_sign(method, path, params)
-        authorization = "AWS" + " " + str(self.access_key) + ":" + sign
-        header_data = {
-            'Date': request_date,
-            'Authorization': authorization,
-        }
-        if 'x-amz-acl' in params:
-            header_data['x-amz-acl'] = params['x-amz-acl']
-        if 'content_length' in params:
-            header_data['Content-Length'] = params['content_length']
-        if 'content_type' in params:
-            header_data['Content-Type'] = params['content_type']
+        # one pass over the (usually two or three) params picks out both the
+        # plain headers and the x-amz- ones that have to be signed
+        header_data = {}
+        amz_names = []
+        for name in params:
+            header = PARAM_HEADERS.get(name)
+            if header is not None:
+                header_data[header] = params[name]
+            elif name[:6].lower() == 'x-amz-':
+                amz_names.append(name)
+                header_data[name] = params[name]
+        # the Date header and the signed string must use the same timestamp
+        request_date = http_date()
+        sign = self.create_sign(method, path, params, request_date, amz_names)
+        header_data['Date'] = request_date
+        header_data['Authorization'] = "AWS" + " " + str(self.access_key) + ":" + sign
         return header_data
 
-    def create_sign(self, method, path, params):
-        canonicalized_amz_headers = ''
-        if 'x-amz-acl' in params:
-            canonicalized_amz_headers = 'x-amz-acl:%s' % params['x-amz-acl']
-        sign_str = self.create_sign_str(
-            http_method=method,
-            url=path,
-            content_md5=params.get('content_md5', ''),
-            content_type=params.get('content_type', ''),
-            params=params.get('params', ''),
-            canonicalized_amz_headers=canonicalized_amz_headers,
-        )
-        sign = hmac.new(self.secret_key, sign_str, digestmod=hashlib.sha1)
+    def _signer(self):
+        # keying HMAC hashes the secret, so do it once and copy the state
+        # for each request; rebuild it if secret_key has been replaced
+        signer = self._hmac
+        if signer is None or signer[0] is not self.secret_key:
+            signer = (self.secret_key, hmac.new(self.secret_key, digestmod=hashlib.sha1))
+            self._hmac = signer
+        return signer[1].copy()
+
+    @staticmethod
+    def _amz_names(params):
+        return [name for name in params if name[:6].lower() == 'x-amz-']
+
+    @classmethod
+    def canonicalize_amz_headers(cls, params, names=None):
+        """
+        按签名规则拼接 x-amz- 开头的请求头：名称小写，按名称排序，每行 名称:值
+        参数:
+            names: 已经找出的 x-amz- 参数名，None 时从 params 中查找
+        """
+        if names is None:
+            names = cls._amz_names(params)
+        if not names:
+            # most requests carry no x-amz- header at all
+            return ''
+        if len(names) == 1:
+            return '%s:%s' % (names[0].lower(), str(params[names[0]]).strip())
+        headers = sorted((name.lower(), str(params[name]).strip()) for name in names)
+        return '\n'.join('%s:%s' % header for header in headers)
+
+    def create_sign(self, method, path, params, request_date=None, amz_names=None):
+        if amz_names is None:
+            amz_names = self._amz_names(params)
+        # same string as create_sign_str, built inline since this runs on
+        # every request
+        sign_param_list = [method, params.get('content_md5', ''),
+                           params.get('content_type', ''), request_date or http_date()]
+        if amz_names:
+            sign_param_list.append(self.canonicalize_amz_headers(params, amz_names))
+        sign_param_list.append(canonical_resource(path))
+        sign = self._signer()
+        sign.update('\n'.join(sign_param_list))
         return base64.b64encode(sign.digest())
 
+    def presign(self, method, path, expires_in=3600, params=None):
+        """
+        生成预签名 URL，持有 URL 的客户端无需密钥即可在有效期内发送该请求
+        参数:
+            method: 请求方法
+            path: 请求路径，包括子资源，例如 /bucket/key?partNumber=1&uploadId=...
+            expires_in: 有效期（秒）
+            params: 参与签名的参数，例如 content_type、content_md5、x-amz-acl，
+                使用 URL 的请求必须带上相同的请求头
+        """
+        if params is None:
+            params = {}
+        # query string authentication signs the expiry time in place of the date
+        expires = str(int(time.time() + expires_in))
+        sign = self.create_sign(method, path, params, expires)
+        if self.endpoints is not None:
+            url = self.endpoints.choose().url(path)
+        else:
+            url = '%s://%s%s' % (self.protocol, self.host, path)
+        return '%s%sAWSAccessKeyId=%s&Expires=%s&Signature=%s' % (
+            url, '&' if '?' in path else '?',
+            urllib.quote(self.access_key, safe=''), expires, urllib.quote(sign, safe=''))
+
     @staticmethod
     def create_sign_str(**params):
-        http_header_date = str(
-            datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT')
-        )
+        http_header_date = params.get('http_header_date') or http_date()
 
         sign_param_list = [params['http_method'], params[
             'content_md5'], params['content_type'], http_header_date]
@@ -152,68 +399,215 @@ class AbstractProductAPI(object):
         sign_param_list.append(params['url'])
         return '\n'.join(sign_param_list)
 
-    def request(self, method, path, data, params):
-        last_exception = None
-        connection = self.pool.get_connection()
-        try:
-            # for now we do 5 times retry to ignore more connection related
-            # exceptions.
-            for i in range(5):
-                try:
-                    if method == 'GET':
-                        req_path = path
-                        connection.request(
-                            method, req_path, data, self._generate_headers(method, path, params))
-                    elif method == 'PUT':
-                        req_path = path
-                        connection.request(
-                            method, req_path, data, self._generate_headers(method, path, params))
-
-                    elif method == 'DELETE':
-                        req_path = path
-                        connection.request(
-                            method, req_path, data, self._generate_headers(method, path, params))
-                    elif method == 'POST':
-                        req_path = path
-                        connection.request(
-                            method, req_path, data, self._generate_headers(method, path, params))
-                    resp = connection.getresponse()
-                    self.response_header = resp.getheaders()
-                    return resp.read()
-                except httplib.HTTPException, e:
-                    self.pool.reconnect(connection)
-                    last_exception = e
-                except socket.error, e:
-                    self.pool.reconnect(connection)
-                    if 1 < i < 4:
-                        time.sleep(1)
-                    last_exception = e
-            # if we got there, we got some connection related problems so we should rise this
-            # Exception to upper function. If we do nothing here this function will return None
-            # instead so we may got some error else.
-            raise last_exception
-        finally:
-            self.pool.put_connection(connection)
+    def _send_request(self, connection, method, path, data, headers):
+        chunked = headers.get('Transfer-Encoding') == 'chunked'
+        if not is_stream(data) and not chunked and (self.rate_limiter is None or not data):
+            connection.request(method, path, data, headers)
+            return
+        # stream file objects, iterators and buffers chunk by chunk so the
+        # whole body never has to be held in memory
+        connection.putrequest(method, path)
+        for header, value in headers.items():
+            connection.putheader(header, value)
+        connection.endheaders()
+        for chunk in iter_body(data):
+            if self.rate_limiter is not None:
+                self.rate_limiter.consume(len(chunk))
+            if chunked:
+                chunk = '%x\r\n%s\r\n' % (len(chunk), chunk)
+            connection.send(chunk)
+        if chunked:
+            connection.send('0\r\n\r\n')
+
+    def _route(self, path, previous=None):
+        """
+        选择本次请求的服务地址，返回 (Endpoint 或 None, 连接池, 请求行中的路径)
+        """
+        if self.endpoints is None:
+            return None, self.pool, path
+        endpoint = self.endpoints.acquire(exclude=previous)
+        host, request_path = endpoint.route(path)
+        return endpoint, endpoint.pool(host), request_path
+
+    def _release_endpoint(self, endpoint, latency=None, failed=False):
+        if endpoint is not None:
+            self.endpoints.release(endpoint, latency, failed)
+
+    @staticmethod
+    def _release_connection(pool, connection, reusable):
+        if not reusable:
+            pool.reconnect(connection)
+        pool.put_connection(connection)
+
+    def _emit_response(self, method, path, operation, attempt, start, timing, status=None,
+                       error=None, bytes_sent=0, bytes_received=0, host=None):
+        if self.hooks.enabled('after_response'):
+            self.hooks.emit('after_response', method=method, path=path, operation=operation,
+                            attempt=attempt, host=host, status=status, error=error,
+                            total=time.time() - start, bytes_sent=bytes_sent,
+                            bytes_received=bytes_received, **timing)
+
+    def _backoff(self, method, path, operation, attempt, status=None, error=None):
+        delay = self.retry_policy.backoff(attempt)
+        if self.hooks.enabled('on_retry'):
+            self.hooks.emit('on_retry', method=method, path=path, operation=operation,
+                            attempt=attempt, status=status, error=error, delay=delay)
+        time.sleep(delay)
+
+    def _connect(self, pool, connection):
+        # open the socket explicitly so connect/TLS time is measured apart
+        # from the request itself; httplib would otherwise do it in send()
+        start = time.time()
+        connection.connect()
+        elapsed = time.time() - start
+        if self.hooks.enabled('on_connection_created'):
+            self.hooks.emit('on_connection_created', host=pool.host,
+                            protocol=pool.protocol, connect=elapsed)
+        return elapsed
 
-    def post(self, path, data=None, params=None):
+    def request(self, method, path, data, params, stream=False):
+        """
+        发送请求，返回响应内容；stream 为 True 时返回 StreamingResponse
+        需要状态码或响应头时使用 send
+        """
+        resp = self.send(method, path, data, params, stream)
+        if stream:
+            return resp
+        return resp.body
+
+    def send(self, method, path, data, params, stream=False):
+        """
+        发送请求，返回 Response（状态码、响应头和响应内容）
+        stream 为 True 时返回未读取响应体的 StreamingResponse，
+        连接在响应读取完毕或关闭后归还连接池
+        失败时按 retry_policy 重试，每次重试都从连接池重新获取连接；
+        配置了 endpoints 时每次尝试重新选择服务地址
+        各阶段耗时和流量通过 hooks 上报
+        返回的对象只属于本次请求，同一个客户端可以被多个线程同时使用
+        """
+        chunked = params.get('transfer_encoding') == 'chunked'
+        if data is not None and 'content_length' not in params and not chunked:
+            length = body_length(data)
+            if length is None:
+                raise ProductAPIError(
+                    'content_length or chunked transfer_encoding is required '
+                    'for streaming request body')
+            params = dict(params, content_length=str(length))
+        bytes_sent = int(params.get('content_length') or 0)
+        position = body_position(data)
+        policy = self.retry_policy
+        hooks = self.hooks
+        operation = operation_name(method, path)
+        attempt = 0
+        endpoint = None
+        while True:
+            start = time.time()
+            if hooks.enabled('before_request'):
+                hooks.emit('before_request', method=method, path=path, operation=operation,
+                           attempt=attempt)
+            endpoint, pool, request_path = self._route(path, endpoint)
+            try:
+                connection = pool.get_connection()
+            except:
+                self._release_endpoint(endpoint)
+                raise
+            timing = {'pool_wait': time.time() - start, 'connect': None, 'sign': None,
+                      'ttfb': None, 'transfer': None}
+            sent = False
+            try:
+                if connection.sock is None:
+                    timing['connect'] = self._connect(pool, connection)
+                mark = time.time()
+                headers = self._generate_headers(method, path, params)
+                timing['sign'] = time.time() - mark
+                mark = time.time()
+                self._send_request(connection, method, request_path, data, headers)
+                sent = True
+                resp = connection.getresponse()
+                timing['ttfb'] = time.time() - mark
+                retry = (resp.status in policy.retry_statuses and
+                         policy.should_retry(method, attempt, status=resp.status) and
+                         rewind_body(data, position))
+                if retry or not stream:
+                    mark = time.time()
+                    body = resp.read()
+                    timing['transfer'] = time.time() - mark
+            except (httplib.HTTPException, socket.error), e:
+                self._release_connection(pool, connection, False)
+                self._release_endpoint(endpoint, failed=True)
+                self._emit_response(method, path, operation, attempt, start, timing, error=e,
+                                    bytes_sent=bytes_sent if sent else 0, host=pool.host)
+                # a consumed iterator can not be sent again
+                if (not policy.should_retry(method, attempt, sent=sent) or
+                        not rewind_body(data, position)):
+                    raise
+                self._backoff(method, path, operation, attempt, error=e)
+                attempt += 1
+                continue
+            except:
+                self._release_connection(pool, connection, False)
+                self._release_endpoint(endpoint)
+                raise
+            if retry:
+                self._release_connection(pool, connection, resp.isclosed())
+                self._release_endpoint(endpoint, timing['ttfb'], resp.status >= 500)
+                self._emit_response(method, path, operation, attempt, start, timing,
+                                    resp.status, bytes_sent=bytes_sent, bytes_received=len(body),
+                                    host=pool.host)
+                self._backoff(method, path, operation, attempt, status=resp.status)
+                attempt += 1
+                continue
+            if resp.status < 500:
+                policy.on_success()
+            if stream:
+                return self._stream_response(pool, connection, endpoint, resp, method, path,
+                                             operation, attempt, start, timing, bytes_sent)
+            self._release_connection(pool, connection, resp.isclosed())
+            self._release_endpoint(endpoint, timing['ttfb'], resp.status >= 500)
+            self._emit_response(method, path, operation, attempt, start, timing, resp.status,
+                                bytes_sent=bytes_sent, bytes_received=len(body), host=pool.host)
+            return Response(resp.status, resp.reason, resp.getheaders(), body)
+
+    def _stream_response(self, pool, connection, endpoint, resp, method, path, operation,
+                         attempt, start, timing, bytes_sent):
+        body_start = time.time()
+
+        def release(reusable):
+            self._release_connection(pool, connection, reusable)
+            self._release_endpoint(endpoint, timing['ttfb'], resp.status >= 500)
+            timing['transfer'] = time.time() - body_start
+            self._emit_response(method, path, operation, attempt, start, timing, resp.status,
+                                bytes_sent=bytes_sent, bytes_received=streaming.bytes_read,
+                                host=pool.host)
+
+        streaming = StreamingResponse(resp, release, self.rate_limiter)
+        return streaming
+
+    def post(self, path, data=None, params=None, stream=False):
         if params is None:
             params = {}
-        return self.request('POST', path, data, params)
+        return self.request('POST', path, data, params, stream=stream)
 
-    def get(self, path, data=None, params=None):
+    def get(self, path, data=None, params=None, stream=False):
         if params is None:
             params = {}
-        return self.request('GET', path, data, params)
+        return self.request('GET', path, data, params, stream=stream)
 
     def put(self, path, data=None, params=None):
         if params is None:
             params = {}
         return self.request('PUT', path, data, params)
 
+    def head(self, path, data=None, params=None):
+        if params is None:
+            params = {}
+        return self.request('HEAD', path, data, params, stream=True)
+
     def upload_big_data_put(self, path, data=None, params=None):
         if params is None:
             params = {}
-        return self.request('PUT', path, data, params), self.response_header
+        resp = self.send('PUT', path, data, params)
+        return resp.body, resp.headers
 
     def delete(self, path, data=None, params=None):
         if params is None:
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+import types
+
+from speedycloud.object_storage import DEFAULT_HOST, AbstractProductAPI, ConnectionPool
+from speedycloud.object_storage.object_storage import ObjectStorageAPI
+from speedycloud.object_storage.workers import WorkerPool
+
+DEFAULT_CONCURRENCY = 64
+
+# inspect.CO_GENERATOR, inspect itself is slow to import
+CO_GENERATOR = 0x20
+# methods that send no request, presigned URLs are computed locally
+LOCAL_METHODS = frozenset([
+    'presigned_get_url',
+    'presigned_put_url',
+    'presigned_upload_part_url',
+])
+
+
+def _operations():
+    """
+    ObjectStorageAPI 中可以在后台执行的公开接口，新增的接口自动包含在内；
+    生成器（iter_*）需要由调用方逐条读取，send 等底层请求方法也不包含在内
+    """
+    names = []
+    for name, value in sorted(vars(ObjectStorageAPI).items()):
+        if name.startswith('_') or not isinstance(value, types.FunctionType):
+            continue
+        if value.func_code.co_flags & CO_GENERATOR or name in LOCAL_METHODS:
+            continue
+        if hasattr(AbstractProductAPI, name):
+            continue
+        names.append(name)
+    return tuple(names)
+
+
+OPERATIONS = _operations()
+
+
+def gather(futures, timeout=None):
+    """
+    等待全部 Future 完成，按顺序返回结果，任一失败时抛出其异常
+    """
+    return [future.result(timeout) for future in futures]
+
+
+class AsyncObjectStorageAPI(object):
+    """
+    基于线程池的对象存储 API，每个接口立即返回 Future，请求由后台线程并发执行
+    参数:
+        access_key: 访问秘钥
+        secret_key: 私有秘钥
+        protocol: 'http' 或 'https'
+        concurrency: 同时执行的请求数上限，同时也是专用连接池的连接数上限
+        host: 服务地址（主机名，可以带端口）
+        endpoints: EndpointRouter 实例，指定后使用各服务地址自己的连接池
+    注意：接口与 ObjectStorageAPI 相同，返回值通过 future.result() 获取；
+        每个请求仍以阻塞方式占用一个后台线程，并发数受 concurrency 限制；
+        iter_* 和 presigned_* 不发送请求或需要逐条读取，直接使用 self.api 调用
+    """
+
+    def __init__(self, access_key, secret_key, protocol='http', concurrency=DEFAULT_CONCURRENCY,
+                 host=DEFAULT_HOST, endpoints=None):
+        self.api = ObjectStorageAPI(access_key, secret_key, protocol, host=host,
+                                    endpoints=endpoints)
+        self.api.pool = ConnectionPool(
+            self.api.host, protocol, size=0, max_size=concurrency, timeout=None)
+        self.concurrency = concurrency
+        self.workers = WorkerPool(concurrency, max_pending=0)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        在后台执行任意函数，返回 Future
+        """
+        return self.workers.submit(fn, *args, **kwargs)
+
+    def close(self):
+        """
+        等待已提交的请求完成，然后关闭后台线程和专用连接池的连接
+        """
+        self.workers.shutdown()
+        self.api.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _make_operation(name):
+    method = getattr(ObjectStorageAPI, name)
+
+    def operation(self, *args, **kwargs):
+        return self.workers.submit(getattr(self.api, name), *args, **kwargs)
+
+    operation.__name__ = name
+    operation.__doc__ = method.__doc__
+    return operation
+
+
+for _name in OPERATIONS:
+    setattr(AsyncObjectStorageAPI, _name, _make_operation(_name))
+del _name
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+
+import os
+import time
+import errno
+import hashlib
+import cPickle as pickle
+import tempfile
+import threading
+
+
+class CacheEntry(object):
+    """
+    缓存的响应
+    属性:
+        body: 响应内容
+        etag: 响应头 ETag，用于 If-None-Match 验证
+        last_modified: 响应头 Last-Modified，用于 If-Modified-Since 验证
+        expires: 过期时间戳，过期后需要向服务端验证
+    """
+    __slots__ = ('body', 'etag', 'last_modified', 'expires')
+
+    def __init__(self, body, etag=None, last_modified=None, expires=0):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    def fresh(self, now=None):
+        return (now if now is not None else time.time()) < self.expires
+
+    def __getstate__(self):
+        return (self.body, self.etag, self.last_modified, self.expires)
+
+    def __setstate__(self, state):
+        self.body, self.etag, self.last_modified, self.expires = state
+
+
+class LRUCache(object):
+    """
+    进程内 LRU 缓存
+    参数:
+        max_entries: 最多缓存的条目数
+        max_bytes: 缓存内容的总字节数上限
+        ttl: 条目的有效期（秒），过期的条目保留用于条件请求验证
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=60):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.lock = threading.Lock()
+        # key -> [key, entry, prev, next], a circular list with the most
+        # recently used entry right after the root
+        self.map = {}
+        self.root = root = []
+        root[:] = [None, None, root, root]
+
+    def __len__(self):
+        return len(self.map)
+
+    def _unlink(self, node):
+        node[2][3] = node[3]
+        node[3][2] = node[2]
+
+    def _link_front(self, node):
+        root = self.root
+        node[2] = root
+        node[3] = root[3]
+        root[3][2] = node
+        root[3] = node
+
+    def get(self, key):
+        self.lock.acquire()
+        try:
+            node = self.map.get(key)
+            if node is None:
+                return None
+            self._unlink(node)
+            self._link_front(node)
+            return node[1]
+        finally:
+            self.lock.release()
+
+    def set(self, key, entry):
+        size = len(entry.body or '')
+        if size > self.max_bytes:
+            return
+        self.lock.acquire()
+        try:
+            self._remove(key)
+            node = [key, entry, None, None]
+            self._link_front(node)
+            self.map[key] = node
+            self.bytes += size
+            while len(self.map) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(self.root[2][0])
+        finally:
+            self.lock.release()
+
+    def _remove(self, key):
+        node = self.map.pop(key, None)
+        if node is not None:
+            self._unlink(node)
+            self.bytes -= len(node[1].body or '')
+
+    def delete(self, key):
+        self.lock.acquire()
+        try:
+            self._remove(key)
+        finally:
+            self.lock.release()
+
+    def invalidate_prefix(self, prefix):
+        self.lock.acquire()
+        try:
+            for key in [k for k in self.map if k.startswith(prefix)]:
+                self._remove(key)
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        self.invalidate_prefix('')
+
+
+class DiskCache(object):
+    """
+    磁盘缓存，接口与 LRUCache 相同，可在进程之间共享
+    参数:
+        directory: 缓存目录
+        max_entries: 最多缓存的条目数，超出时删除最久未使用的条目
+        ttl: 条目的有效期（秒）
+    注意：文件名以桶名的哈希开头，按桶失效时只读取该桶的条目
+    """
+
+    def __init__(self, directory, max_entries=4096, ttl=60):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    @staticmethod
+    def _bucket_tag(key):
+        """
+        返回 (键中桶名的哈希, 桶名是否完整)，键形如 /桶名/对象名 或 /桶名?子资源
+        """
+        rest = key.lstrip('/')
+        end = len(rest)
+        for separator in '/?':
+            index = rest.find(separator)
+            if index != -1:
+                end = min(end, index)
+        return hashlib.sha1(rest[:end]).hexdigest()[:16], end < len(rest)
+
+    def _path(self, key):
+        return os.path.join(self.directory, '%s-%s' % (
+            self._bucket_tag(key)[0], hashlib.sha1(key).hexdigest()))
+
+    def _load(self, path):
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def get(self, key):
+        path = self._path(key)
+        item = self._load(path)
+        if item is None or item[0] != key:
+            return None
+        try:
+            # the modification time records the last use for LRU eviction
+            os.utime(path, None)
+        except OSError:
+            pass
+        return item[1]
+
+    def set(self, key, entry):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((key, entry), f, pickle.HIGHEST_PROTOCOL)
+            if os.name == 'nt' and os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+            os.rename(tmp_path, self._path(key))
+        except:
+            remove_file(tmp_path)
+            raise
+        self._evict()
+
+    def _entries(self, tag=''):
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                if name.startswith(tag) and not name.endswith('.tmp')]
+
+    def _evict(self):
+        paths = self._entries()
+        if len(paths) <= self.max_entries:
+            return
+        by_age = []
+        for path in paths:
+            try:
+                by_age.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+        by_age.sort()
+        for mtime, path in by_age[:len(by_age) - self.max_entries]:
+            remove_file(path)
+
+    def delete(self, key):
+        remove_file(self._path(key))
+
+    def invalidate_prefix(self, prefix):
+        tag, complete = self._bucket_tag(prefix)
+        # a prefix that names its whole bucket only needs that bucket's
+        # entries, anything shorter has to look at all of them
+        for path in self._entries(tag + '-' if complete else ''):
+            item = self._load(path)
+            if item is not None and item[0].startswith(prefix):
+                remove_file(path)
+
+    def clear(self):
+        for path in self._entries():
+            remove_file(path)
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError, e:
+        if e.errno != errno.ENOENT:
+            raise
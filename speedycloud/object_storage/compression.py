@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+
+import zlib
+import tempfile
+from cStringIO import StringIO
+
+from speedycloud.object_storage.streams import (
+    CHUNK_SIZE, body_length, body_position, iter_body, rewind_body)
+
+# Content-Encoding -> zlib window bits, 16 + MAX_WBITS writes a gzip header
+ENCODINGS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS,
+}
+# content types that are compressed already
+INCOMPRESSIBLE_TYPES = (
+    'image/', 'video/', 'audio/', 'application/zip', 'application/gzip',
+    'application/x-gzip', 'application/x-bzip2', 'application/x-xz',
+    'application/x-7z-compressed', 'application/octet-stream+gzip',
+)
+UNCOMPRESSED_SIZE_HEADER = 'x-amz-meta-uncompressed-size'
+DEFAULT_SPOOL_SIZE = 8 * 1024 * 1024
+
+
+class Compression(object):
+    """
+    上传时压缩对象内容，下载时自动解压
+    参数:
+        encoding: 'gzip' 或 'deflate'，作为 Content-Encoding 保存在对象上
+        level: 压缩级别 1-9，级别越高压缩率越高、越慢
+        min_size: 小于该大小（字节）的内容不压缩
+        max_ratio: 抽样压缩后的大小超过原大小的该比例时不压缩（例如已压缩的数据）
+        sample_size: 用于判断压缩率的抽样大小（字节）
+        chunked: 为 True 时边压缩边以 chunked 编码发送，不在本地暂存压缩结果，
+            但请求失败后无法重试
+        spool_size: chunked 为 False 时，压缩结果超过该大小（字节）则暂存到临时文件
+    注意：压缩后的对象 ETag、Content-Length 和 Range 均针对压缩后的数据，
+        原始大小记录在 x-amz-meta-uncompressed-size 中
+    """
+
+    def __init__(self, encoding='gzip', level=6, min_size=1024, max_ratio=0.9,
+                 sample_size=CHUNK_SIZE, chunked=False, spool_size=DEFAULT_SPOOL_SIZE):
+        if encoding not in ENCODINGS:
+            raise ValueError('unsupported encoding: %s' % encoding)
+        self.encoding = encoding
+        self.level = level
+        self.min_size = min_size
+        self.max_ratio = max_ratio
+        self.sample_size = sample_size
+        self.chunked = chunked
+        self.spool_size = spool_size
+
+    def _compressor(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, ENCODINGS[self.encoding])
+
+    def _compresses(self, sample):
+        compressor = self._compressor()
+        size = len(compressor.compress(sample)) + len(compressor.flush())
+        return size <= len(sample) * self.max_ratio
+
+    def _skip(self, params):
+        if 'content_encoding' in params:
+            return True
+        content_type = params.get('content_type', '').lower()
+        return content_type.startswith(INCOMPRESSIBLE_TYPES)
+
+    def _params(self, params, length):
+        # the length and MD5 given by the caller describe the original data
+        params = dict((k, v) for k, v in params.items()
+                      if k not in ('content_length', 'content_md5'))
+        params['content_encoding'] = self.encoding
+        if length is not None:
+            params[UNCOMPRESSED_SIZE_HEADER] = str(length)
+        return params
+
+    def encode(self, data, params):
+        """
+        按需压缩请求体，返回 (请求体, 请求参数)，不压缩时原样返回
+        参数:
+            data: 字符串或可回退的文件对象
+            params: 请求参数，压缩时去掉原有的 content_length、content_md5，
+                增加 content_encoding 和原始大小
+        注意：不可回退的文件对象和迭代器不压缩
+        """
+        if data is None or self._skip(params):
+            return data, params
+        if isinstance(data, str):
+            if len(data) < self.min_size or not self._compresses(data[:self.sample_size]):
+                return data, params
+            compressor = self._compressor()
+            compressed = compressor.compress(data) + compressor.flush()
+            if len(compressed) > len(data) * self.max_ratio:
+                return data, params
+            return compressed, self._params(params, len(data))
+        if not hasattr(data, 'read'):
+            return data, params
+        length = body_length(data)
+        position = body_position(data)
+        if position is None or (length is not None and length < self.min_size):
+            return data, params
+        sample = data.read(self.sample_size)
+        rewind_body(data, position)
+        if not self._compresses(sample):
+            return data, params
+        params = self._params(params, length)
+        if self.chunked:
+            params['transfer_encoding'] = 'chunked'
+            return self._iter_compressed(data), params
+        return self._spool(data), params
+
+    def _iter_compressed(self, data):
+        compressor = self._compressor()
+        for chunk in iter_body(data):
+            chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+
+    def _spool(self, data):
+        """
+        将压缩结果写入内存，超过 spool_size 后转存到临时文件，返回回到起始位置的文件对象
+        """
+        spool = StringIO()
+        in_memory = True
+        for chunk in self._iter_compressed(data):
+            if in_memory and spool.tell() + len(chunk) > self.spool_size:
+                temp = tempfile.TemporaryFile()
+                temp.write(spool.getvalue())
+                spool = temp
+                in_memory = False
+            spool.write(chunk)
+        spool.seek(0)
+        return spool
+
+
+def decompress(data, encoding):
+    """
+    解压完整的响应内容
+    """
+    return zlib.decompress(data, ENCODINGS[encoding])
+
+
+class DecodingResponse(object):
+    """
+    边读取边解压的响应，接口与 StreamingResponse 相同
+    参数:
+        response: StreamingResponse
+        encoding: 响应头 Content-Encoding 的值
+        source: 读取压缩数据的对象，默认为 response，可以传入包装 response 的 HashingReader
+    """
+
+    def __init__(self, response, encoding, source=None):
+        self.response = response
+        self.source = source if source is not None else response
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        self.decompressor = zlib.decompressobj(ENCODINGS[encoding])
+        self.buffer = ''
+        self.eof = False
+
+    def getheader(self, name, default=None):
+        return self.response.getheader(name, default)
+
+    def _fill(self, size):
+        while not self.eof and (size is None or len(self.buffer) < size):
+            chunk = self.source.read(CHUNK_SIZE)
+            if chunk:
+                self.buffer += self.decompressor.decompress(chunk)
+            else:
+                self.buffer += self.decompressor.flush()
+                self.eof = True
+
+    def read(self, amt=None):
+        if amt is not None and amt < 0:
+            amt = None
+        self._fill(amt)
+        if amt is None:
+            data, self.buffer = self.buffer, ''
+        else:
+            data, self.buffer = self.buffer[:amt], self.buffer[amt:]
+        return data
+
+    def iter_chunks(self, chunk_size=CHUNK_SIZE):
+        try:
+            while True:
+                chunk = self.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.close()
+
+    def __iter__(self):
+        return self.iter_chunks()
+
+    def close(self):
+        self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
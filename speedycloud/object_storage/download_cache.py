@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+import os
+import mmap
+import errno
+import hashlib
+import urllib
+import tempfile
+import threading
+
+from speedycloud.object_storage import ProductAPIError
+from speedycloud.object_storage.cache import remove_file
+from speedycloud.object_storage.integrity import HashingReader, etag_md5, verify_etag
+from speedycloud.object_storage.streams import iter_body, write_chunks
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024 * 1024
+# file name used when the server sent no ETag, such files are always refetched
+NO_ETAG = '_'
+
+
+class DownloadCache(object):
+    """
+    对象内容的本地磁盘缓存，按 桶/对象名/ETag 存放，命中时通过 mmap 读取
+    参数:
+        directory: 缓存目录
+        max_bytes: 缓存占用的磁盘空间上限，超出时删除最久未使用的文件
+    注意：每次读取都会发送带 If-None-Match 的条件请求确认缓存仍然有效，
+        文件先写入临时文件再改名，多个进程可以共享同一个缓存目录
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        _makedirs(directory)
+
+    def _key_dir(self, bucket, key):
+        return os.path.join(self.directory, hashlib.sha1('%s/%s' % (bucket, key)).hexdigest())
+
+    def lookup(self, bucket, key):
+        """
+        返回已缓存的 (文件路径, etag)，没有缓存时返回 (None, None)
+        """
+        key_dir = self._key_dir(bucket, key)
+        try:
+            names = [n for n in os.listdir(key_dir) if not n.endswith('.tmp')]
+        except OSError:
+            return None, None
+        if not names:
+            return None, None
+        name = names[0]
+        return os.path.join(key_dir, name), None if name == NO_ETAG else name.decode('hex')
+
+    def get(self, api, bucket, key):
+        """
+        读取对象，返回只读 mmap（空对象返回空字符串）
+        参数:
+            api: ObjectStorageAPI 实例
+            bucket: 桶名
+            key: 对象名
+        """
+        path, etag = self.lookup(bucket, key)
+        while True:
+            params = {}
+            if etag is not None:
+                params['if_none_match'] = etag
+            resp = api.get(api._get_path('%s/%s' % (bucket, urllib.quote(key))), params=params,
+                           stream=True)
+            if resp.status != 304 or path is None:
+                break
+            resp.close()
+            try:
+                os.utime(path, None)
+                return _map(path)
+            except (IOError, OSError):
+                # evicted by another process in the meantime, the second
+                # request is unconditional so it can not be answered with 304
+                path = etag = None
+        if resp.status != 200:
+            body = resp.read()
+            raise ProductAPIError('GET %s/%s failed: %s %s %s' % (
+                bucket, key, resp.status, resp.reason, body))
+        return self._store(api, bucket, key, resp)
+
+    def _store(self, api, bucket, key, resp):
+        """
+        将响应写入缓存，返回文件的 mmap
+        """
+        etag = resp.getheader('etag')
+        key_dir = self._key_dir(bucket, key)
+        try:
+            _makedirs(key_dir)
+            fd, tmp_path = tempfile.mkstemp(dir=key_dir, suffix='.tmp')
+            try:
+                reader = None
+                if api.verify_integrity and etag_md5(etag) is not None:
+                    reader = HashingReader(resp)
+                with os.fdopen(fd, 'wb') as f:
+                    # compressed objects are cached decompressed so they can be mapped
+                    write_chunks(iter_body(api._decode(resp, reader)), f)
+                if reader is not None:
+                    verify_etag(reader.hexdigest(), etag, 'GET %s/%s' % (bucket, key))
+                path = os.path.join(key_dir, etag.encode('hex') if etag else NO_ETAG)
+                os.rename(tmp_path, path)
+            except:
+                remove_file(tmp_path)
+                raise
+        finally:
+            # the body is left unread when writing fails
+            resp.close()
+        # older versions of the object are no longer useful
+        for name in os.listdir(key_dir):
+            if name != os.path.basename(path) and not name.endswith('.tmp'):
+                remove_file(os.path.join(key_dir, name))
+        # mapped before evicting, the mapping stays readable even if another
+        # process removes the file; an object bigger than max_bytes is kept
+        # until the next download evicts it
+        data = _map(path)
+        self.evict(keep=path)
+        return data
+
+    def evict(self, keep=None):
+        """
+        缓存超出 max_bytes 时按最近使用时间删除文件
+        参数:
+            keep: 不删除的文件路径，例如刚下载的文件
+        """
+        self.lock.acquire()
+        try:
+            files = []
+            total = 0
+            for root, dirs, names in os.walk(self.directory):
+                for name in names:
+                    path = os.path.join(root, name)
+                    if name.endswith('.tmp') or path == keep:
+                        continue
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+            files.sort()
+            for mtime, size, path in files:
+                if total <= self.max_bytes:
+                    break
+                remove_file(path)
+                total -= size
+        finally:
+            self.lock.release()
+
+
+def _map(path):
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _makedirs(directory):
+    try:
+        os.makedirs(directory)
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
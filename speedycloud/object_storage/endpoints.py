@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+import re
+import time
+import threading
+
+from speedycloud.object_storage import DEFAULT_HOST, ConnectionPool
+
+ADDRESSING_STYLES = ('path', 'virtual')
+ROUTING_STRATEGIES = ('latency', 'least_outstanding')
+
+# bucket names usable as a DNS label in front of the endpoint host; dots
+# are left out because they break wildcard certificates
+_DNS_BUCKET = re.compile(r'^[a-z0-9][a-z0-9-]{1,61}[a-z0-9]$')
+
+
+def split_bucket(path):
+    """
+    将 /桶名/对象名?子资源 拆分为 (桶名, /对象名?子资源)，路径中没有桶名时返回 (None, 路径)
+    """
+    end = len(path)
+    for separator in '/?':
+        index = path.find(separator, 1)
+        if index != -1:
+            end = min(end, index)
+    bucket = path[1:end]
+    if not bucket:
+        return None, path
+    rest = path[end:]
+    if not rest.startswith('/'):
+        rest = '/' + rest
+    return bucket, rest
+
+
+class Endpoint(object):
+    """
+    服务地址，每个连接主机使用独立的连接池
+    参数:
+        host: 主机名，可以带端口，例如 oss-cn-beijing.speedycloud.org、127.0.0.1:9000
+        protocol: 'http' 或 'https'
+        addressing: 'path' 表示 主机名/桶名/对象名，'virtual' 表示 桶名.主机名/对象名；
+            桶名不能作为域名（包含大写字母、点、下划线等）时仍使用 path 方式
+        pool_size: 每个连接池保留的连接数
+        max_pool_size: 每个连接池的连接数上限
+    注意：virtual 方式下每个桶对应一个连接主机和一个连接池；签名始终按 /桶名/对象名 计算
+    """
+
+    def __init__(self, host=DEFAULT_HOST, protocol='http', addressing='path', pool_size=10,
+                 max_pool_size=100):
+        if protocol not in ('http', 'https'):
+            raise ValueError('unsupported protocol: %s' % protocol)
+        if addressing not in ADDRESSING_STYLES:
+            raise ValueError('unsupported addressing: %s' % addressing)
+        self.host = host
+        self.protocol = protocol
+        self.addressing = addressing
+        self.pool_size = pool_size
+        self.max_pool_size = max_pool_size
+        self.pools = {}
+        self.lock = threading.Lock()
+        # routing state, updated by EndpointRouter under its lock
+        self.outstanding = 0
+        self.latency = None
+        self.last_used = 0
+        self.failures = 0
+        self.ejected_until = 0
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+
+    def __repr__(self):
+        return 'Endpoint(%r, %r, %r)' % (self.host, self.protocol, self.addressing)
+
+    def route(self, path):
+        """
+        返回 (连接主机, 请求行中的路径)
+        """
+        if self.addressing == 'virtual':
+            bucket, rest = split_bucket(path)
+            if bucket is not None and _DNS_BUCKET.match(bucket):
+                return '%s.%s' % (bucket, self.host), rest
+        return self.host, path
+
+    def url(self, path):
+        host, path = self.route(path)
+        return '%s://%s%s' % (self.protocol, host, path)
+
+    def pool(self, host):
+        """
+        连接 host 使用的连接池，第一次使用时创建
+        """
+        self.lock.acquire()
+        try:
+            pool = self.pools.get(host)
+            if pool is None:
+                pool = ConnectionPool(host, self.protocol, self.pool_size, self.max_pool_size)
+                self.pools[host] = pool
+            return pool
+        finally:
+            self.lock.release()
+
+    def stats(self):
+        self.lock.acquire()
+        try:
+            pools = self.pools.items()
+        finally:
+            self.lock.release()
+        return {
+            'host': self.host,
+            'protocol': self.protocol,
+            'addressing': self.addressing,
+            'outstanding': self.outstanding,
+            'latency_ms': self.latency * 1000 if self.latency is not None else None,
+            'requests': self.requests,
+            'errors': self.errors,
+            'ejections': self.ejections,
+            'ejected': self.ejected_until > time.time(),
+            'pools': dict((host, pool.stats()) for host, pool in pools),
+        }
+
+
+class EndpointRouter(object):
+    """
+    在多个服务地址之间分配请求，暂时剔除连续失败的地址
+    参数:
+        endpoints: Endpoint 或主机名的列表
+        strategy: 'latency' 选择首字节延迟（指数加权平均）乘以进行中请求数最小的地址，
+            'least_outstanding' 选择进行中请求最少的地址，相同时选择延迟低的
+        failure_threshold: 连续失败（连接错误或 5xx 响应）达到该次数后剔除该地址
+        ejection_time: 剔除的时长（秒），到期后重新测量延迟
+        decay: 延迟平均值中最新一次请求的权重
+        probe_interval: latency 策略下，空闲地址超过该时间（秒）未被使用时再选中一次以更新延迟
+    注意：重试时优先选择上一次以外的地址；所有地址都被剔除时选择最早到期的地址
+    """
+
+    def __init__(self, endpoints, strategy='latency', failure_threshold=3, ejection_time=30,
+                 decay=0.3, probe_interval=10):
+        if strategy not in ROUTING_STRATEGIES:
+            raise ValueError('unsupported strategy: %s' % strategy)
+        self.endpoints = [e if isinstance(e, Endpoint) else Endpoint(e) for e in endpoints]
+        if not self.endpoints:
+            raise ValueError('at least one endpoint is required')
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.ejection_time = ejection_time
+        self.decay = decay
+        self.probe_interval = probe_interval
+        self.lock = threading.Lock()
+
+    def _choose(self, now, exclude):
+        candidates = [e for e in self.endpoints if e.ejected_until <= now]
+        if not candidates:
+            return min(self.endpoints, key=lambda e: e.ejected_until)
+        if exclude in candidates and len(candidates) > 1:
+            candidates.remove(exclude)
+        if self.strategy == 'least_outstanding':
+            return min(candidates, key=lambda e: (e.outstanding, e.latency or 0))
+        for e in candidates:
+            # measure new, recovered and long unused endpoints before
+            # trusting their averages
+            if e.outstanding == 0 and (e.latency is None or
+                                       now - e.last_used > self.probe_interval):
+                return e
+        return min(candidates, key=lambda e: (e.latency or 0) * (e.outstanding + 1))
+
+    def choose(self, exclude=None):
+        """
+        选择一个地址（不计入进行中的请求），用于生成预签名 URL 等
+        """
+        self.lock.acquire()
+        try:
+            return self._choose(time.time(), exclude)
+        finally:
+            self.lock.release()
+
+    def acquire(self, exclude=None):
+        """
+        为一次请求选择地址，请求结束后必须调用 release
+        参数:
+            exclude: 尽量避开的地址，例如重试前失败的地址
+        """
+        now = time.time()
+        self.lock.acquire()
+        try:
+            endpoint = self._choose(now, exclude)
+            endpoint.outstanding += 1
+            endpoint.last_used = now
+            return endpoint
+        finally:
+            self.lock.release()
+
+    def release(self, endpoint, latency=None, failed=False):
+        """
+        记录请求结果
+        参数:
+            latency: 首字节延迟（秒），没有收到响应时为 None
+            failed: 是否为连接错误或 5xx 响应
+        """
+        self.lock.acquire()
+        try:
+            endpoint.outstanding -= 1
+            endpoint.requests += 1
+            if failed:
+                endpoint.errors += 1
+                endpoint.failures += 1
+                if endpoint.failures >= self.failure_threshold:
+                    endpoint.failures = 0
+                    endpoint.ejections += 1
+                    endpoint.ejected_until = time.time() + self.ejection_time
+                    endpoint.latency = None
+                return
+            endpoint.failures = 0
+            if latency is not None:
+                if endpoint.latency is None:
+                    endpoint.latency = latency
+                else:
+                    endpoint.latency += self.decay * (latency - endpoint.latency)
+        finally:
+            self.lock.release()
+
+    def stats(self):
+        return [endpoint.stats() for endpoint in self.endpoints]
@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+import threading
+import time
+
+EVENTS = ('before_request', 'after_response', 'on_retry', 'on_connection_created')
+
+# subresources that identify the kind of request in operation names
+_SUBRESOURCES = ('uploads', 'partNumber', 'uploadId', 'delete', 'acl', 'versioning', 'versions')
+
+# latency histogram upper bounds in milliseconds
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000)
+
+
+def operation_name(method, path):
+    """
+    根据请求方法和路径生成操作名，例如 'GET object'、'PUT object?partNumber'、'GET bucket'
+    """
+    resource, _, query = path.partition('?')
+    parts = resource.lstrip('/').split('/', 1)
+    if not parts[0]:
+        kind = 'service'
+    elif len(parts) == 1 or not parts[1]:
+        kind = 'bucket'
+    else:
+        kind = 'object'
+    keys = [item.split('=', 1)[0] for item in query.split('&')]
+    for sub in _SUBRESOURCES:
+        if sub in keys:
+            return '%s %s?%s' % (method, kind, sub)
+    return '%s %s' % (method, kind)
+
+
+class Hooks(object):
+    """
+    请求事件回调
+    事件:
+        before_request: 发送请求前，参数 method、path、operation、attempt
+        after_response: 响应读取完毕或请求失败后，参数包括 host（连接的主机）、status、error、各阶段耗时
+            (pool_wait、connect、sign、ttfb、transfer、total，单位秒) 和 bytes_sent、bytes_received
+        on_retry: 决定重试时，参数 method、path、operation、attempt、status、error、delay
+        on_connection_created: 新建 TCP/TLS 连接后，参数 host、protocol、connect
+    注意：回调在发起请求的线程中同步执行，回调中的异常会传递给调用方
+    """
+
+    def __init__(self):
+        self.handlers = dict((event, []) for event in EVENTS)
+
+    def register(self, event, handler):
+        if event not in self.handlers:
+            raise ValueError('unknown event: %s' % event)
+        self.handlers[event].append(handler)
+
+    def unregister(self, event, handler):
+        self.handlers[event].remove(handler)
+
+    def enabled(self, event):
+        return bool(self.handlers[event])
+
+    def emit(self, event, **info):
+        for handler in self.handlers[event]:
+            handler(event, info)
+
+
+class Histogram(object):
+    """
+    固定桶的直方图
+    """
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        buckets = []
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            buckets.append((bound, count))
+        return {'count': self.count, 'sum': self.sum, 'buckets': buckets}
+
+
+class MetricsCollector(object):
+    """
+    内置的指标汇总：按操作和状态码统计延迟直方图（毫秒）、流量、重试和连接数
+    用法:
+        collector = MetricsCollector()
+        collector.install(api)
+        ...
+        collector.snapshot()  # 导出到监控系统
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.api = None
+        self.reset()
+
+    def reset(self):
+        self.lock.acquire()
+        try:
+            self.started = time.time()
+            self.requests = 0
+            self.errors = 0
+            self.retries = 0
+            self.connections_created = 0
+            self.bytes_sent = 0
+            self.bytes_received = 0
+            self.latency = {}
+            self.status = {}
+            self.phases = {}
+        finally:
+            self.lock.release()
+
+    def install(self, api):
+        """
+        向 api.hooks 注册回调，同时记录 api 用于导出连接池状态
+        """
+        self.api = api
+        api.hooks.register('after_response', self.on_response)
+        api.hooks.register('on_retry', self.on_retry)
+        api.hooks.register('on_connection_created', self.on_connection_created)
+
+    def _observe(self, table, name, value):
+        histogram = table.get(name)
+        if histogram is None:
+            histogram = table[name] = Histogram()
+        histogram.observe(value)
+
+    def on_response(self, event, info):
+        self.lock.acquire()
+        try:
+            self.requests += 1
+            if info.get('error') is not None or (info.get('status') or 0) >= 500:
+                self.errors += 1
+            self.bytes_sent += info.get('bytes_sent') or 0
+            self.bytes_received += info.get('bytes_received') or 0
+            total_ms = info['total'] * 1000
+            self._observe(self.latency, info['operation'], total_ms)
+            self._observe(self.status, str(info.get('status') or 'error'), total_ms)
+            for phase in ('pool_wait', 'connect', 'sign', 'ttfb', 'transfer'):
+                if info.get(phase) is not None:
+                    self._observe(self.phases, phase, info[phase] * 1000)
+        finally:
+            self.lock.release()
+
+    def on_retry(self, event, info):
+        self.lock.acquire()
+        try:
+            self.retries += 1
+        finally:
+            self.lock.release()
+
+    def on_connection_created(self, event, info):
+        self.lock.acquire()
+        try:
+            self.connections_created += 1
+        finally:
+            self.lock.release()
+
+    def snapshot(self):
+        """
+        导出当前指标，返回可直接序列化为 JSON 的字典
+        """
+        self.lock.acquire()
+        try:
+            elapsed = max(time.time() - self.started, 1e-9)
+            result = {
+                'elapsed': elapsed,
+                'requests': self.requests,
+                'errors': self.errors,
+                'retries': self.retries,
+                'connections_created': self.connections_created,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'send_throughput': self.bytes_sent / elapsed,
+                'receive_throughput': self.bytes_received / elapsed,
+                'latency_ms': dict((k, v.snapshot()) for k, v in self.latency.items()),
+                'status_latency_ms': dict((k, v.snapshot()) for k, v in self.status.items()),
+                'phase_ms': dict((k, v.snapshot()) for k, v in self.phases.items()),
+            }
+        finally:
+            self.lock.release()
+        if self.api is not None and self.api.endpoints is not None:
+            result['endpoints'] = self.api.endpoints.stats()
+        elif self.api is not None:
+            result['pool'] = self.api.pool.stats()
+        return result
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+import base64
+import hashlib
+
+from speedycloud.object_storage import ProductAPIError
+from speedycloud.object_storage.streams import iter_body
+
+
+class IntegrityError(ProductAPIError):
+    """
+    服务端返回的 ETag 与本地计算的 MD5 不一致
+    """
+
+
+def etag_md5(etag):
+    """
+    从 ETag 中取出内容的 MD5（十六进制），分段上传生成的 ETag 不是内容的 MD5，返回 None
+    """
+    if not etag:
+        return None
+    etag = etag.strip().strip('"').lower()
+    if len(etag) != 32 or '-' in etag:
+        return None
+    return etag
+
+
+def multipart_etag(etags):
+    """
+    根据各分段的 ETag 计算分段上传完成后对象的 ETag：md5(各分段 MD5 依次拼接)-分段数
+    参数:
+        etags: {分段号: etag}
+    任一分段的 ETag 不是 MD5 时返回 None
+    """
+    digests = []
+    for part_number in sorted(etags):
+        digest = etag_md5(etags[part_number])
+        if digest is None:
+            return None
+        digests.append(digest.decode('hex'))
+    return '%s-%d' % (hashlib.md5(''.join(digests)).hexdigest(), len(digests))
+
+
+def memory_md5(data):
+    """
+    计算内存中请求体（字符串、mmap、memoryview 等）的 MD5，返回 hashlib 对象
+    """
+    md5 = hashlib.md5()
+    if isinstance(data, str):
+        md5.update(data)
+    else:
+        for chunk in iter_body(data):
+            md5.update(chunk)
+    return md5
+
+
+def content_md5(md5):
+    """
+    生成 Content-MD5 请求头的值
+    """
+    return base64.b64encode(md5.digest())
+
+
+def verify_etag(expected, etag, what):
+    """
+    校验服务端返回的 ETag，ETag 不是 MD5（例如服务端加密或分段上传）时不校验
+    参数:
+        expected: 本地计算的 MD5（十六进制）或分段上传的组合 ETag
+        etag: 服务端返回的 ETag
+        what: 出错时用于描述请求的文字
+    """
+    if not etag or expected is None:
+        return
+    actual = etag.strip().strip('"').lower()
+    if '-' not in expected and etag_md5(actual) is None:
+        return
+    if actual != expected:
+        raise IntegrityError('%s: checksum mismatch, local %s, server %s' % (
+            what, expected, actual))
+
+
+class HashingReader(object):
+    """
+    包装文件对象，读取的同时计算 MD5，数据只读一遍
+    参数:
+        source: 文件对象、FileSlice 或 StreamingResponse 等有 read 方法的对象
+    注意：回退到起始位置（请求重试）时重新计算
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.start = source.tell() if hasattr(source, 'tell') else 0
+        self.md5 = hashlib.md5()
+        self.complete = True
+
+    def read(self, size=-1):
+        data = self.source.read(size)
+        if data:
+            self.md5.update(data)
+        return data
+
+    def fileno(self):
+        return self.source.fileno()
+
+    def tell(self):
+        return self.source.tell()
+
+    def seek(self, position, whence=0):
+        self.source.seek(position, whence)
+        # only a full pass from the start position gives a usable digest
+        self.md5 = hashlib.md5()
+        self.complete = self.source.tell() == self.start
+
+    def hexdigest(self):
+        """
+        已读取数据的 MD5（十六进制），读取中途发生过跳转时返回 None
+        """
+        if not self.complete:
+            return None
+        return self.md5.hexdigest()
+
+    def close(self):
+        if hasattr(self.source, 'close'):
+            self.source.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import threading
+
+
+def _text(value):
+    # json hands strings back as unicode, so byte strings are decoded before
+    # they are stored or compared
+    if isinstance(value, str):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+class UploadJournal(object):
+    """
+    分段上传的本地断点记录，保存 uploadID 以及已完成分段的 etag，
+    上传中断后可据此跳过已上传的分段
+    参数:
+        path: 记录文件的路径
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.state = None
+
+    def load(self):
+        """
+        读取记录，文件不存在或已损坏时返回 None
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                state = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if not isinstance(state, dict) or 'upload_id' not in state:
+            return None
+        state['parts'] = dict((int(n), etag) for n, etag in state.get('parts', {}).items())
+        self.state = state
+        return state
+
+    @staticmethod
+    def describe(bucket, key, file_path, part_size):
+        """
+        描述本次上传，桶名、对象名和文件路径统一为 unicode（字节串按 UTF-8 解码），
+        与从记录文件读出的值可以直接比较
+        """
+        stat = os.stat(file_path)
+        return {
+            'bucket': _text(bucket),
+            'key': _text(key),
+            'file': _text(os.path.abspath(file_path)),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'part_size': part_size,
+        }
+
+    def matches(self, description):
+        """
+        记录是否属于同一个文件的同一次上传（文件大小、修改时间和分段大小均未改变）
+        """
+        if self.state is None:
+            return False
+        for name, value in description.items():
+            if _text(self.state.get(name)) != _text(value):
+                return False
+        return True
+
+    def start(self, description, upload_id, parts=None):
+        self.lock.acquire()
+        try:
+            self.state = dict(description, upload_id=upload_id, parts=dict(parts or {}))
+            self._write()
+        finally:
+            self.lock.release()
+
+    def record_part(self, part_number, etag):
+        self.lock.acquire()
+        try:
+            self.state['parts'][part_number] = etag
+            self._write()
+        finally:
+            self.lock.release()
+
+    def _write(self):
+        # write to a temporary file and rename it over the journal so a crash
+        # never leaves a half written journal behind
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.name == 'nt' and os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(tmp_path, self.path)
+
+    def remove(self):
+        self.state = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
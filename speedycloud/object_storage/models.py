@@ -0,0 +1,395 @@
+# -*- coding: utf-8 -*-
+
+S3_NS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+
+_etree = None
+
+
+def load_etree():
+    """
+    返回 lxml.etree，第一次解析 XML 时才导入，不解析响应的程序（例如只上传、下载）不必加载 lxml
+    """
+    global _etree
+    if _etree is None:
+        from lxml import etree
+        _etree = etree
+    return _etree
+
+
+def _tag(name):
+    return '{%s}%s' % (S3_NS, name)
+
+
+class ObjectSummary(object):
+    """
+    桶内对象列表中的一条记录
+    属性:
+        key: 对象名
+        size: 对象大小（字节）
+        etag: 对象的 ETag
+        last_modified: 最后修改时间（ISO 8601 字符串）
+    """
+    __slots__ = ('key', 'size', 'etag', 'last_modified')
+
+    def __init__(self, key, size, etag, last_modified):
+        self.key = key
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def __repr__(self):
+        return 'ObjectSummary(key=%r, size=%r, etag=%r, last_modified=%r)' % (
+            self.key, self.size, self.etag, self.last_modified)
+
+
+class CommonPrefix(object):
+    """
+    指定 delimiter 列举时合并得到的公共前缀
+    """
+    __slots__ = ('prefix',)
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    def __repr__(self):
+        return 'CommonPrefix(prefix=%r)' % self.prefix
+
+
+class Version(object):
+    """
+    对象版本列表中的一条记录
+    属性:
+        key: 对象名
+        version_id: 版本 ID
+        is_latest: 是否为最新版本
+        size: 对象大小（字节），删除标记为 None
+        etag: 对象的 ETag，删除标记为 None
+        last_modified: 最后修改时间（ISO 8601 字符串）
+        delete_marker: 是否为删除标记
+    """
+    __slots__ = ('key', 'version_id', 'is_latest', 'size', 'etag', 'last_modified',
+                 'delete_marker')
+
+    def __init__(self, key, version_id, is_latest, size, etag, last_modified,
+                 delete_marker=False):
+        self.key = key
+        self.version_id = version_id
+        self.is_latest = is_latest
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.delete_marker = delete_marker
+
+    def __repr__(self):
+        return ('Version(key=%r, version_id=%r, is_latest=%r, size=%r, etag=%r, '
+                'last_modified=%r, delete_marker=%r)') % (
+            self.key, self.version_id, self.is_latest, self.size, self.etag,
+            self.last_modified, self.delete_marker)
+
+
+class Grant(object):
+    """
+    访问控制列表中的一条授权
+    属性:
+        grantee_type: 被授权者类型，CanonicalUser 或 Group
+        grantee_id: 用户 ID（CanonicalUser）
+        display_name: 用户显示名
+        uri: 用户组 URI（Group），例如 http://acs.amazonaws.com/groups/global/AllUsers
+        permission: 权限，例如 READ、WRITE、FULL_CONTROL
+    """
+    __slots__ = ('grantee_type', 'grantee_id', 'display_name', 'uri', 'permission')
+
+    def __init__(self, grantee_type, grantee_id, display_name, uri, permission):
+        self.grantee_type = grantee_type
+        self.grantee_id = grantee_id
+        self.display_name = display_name
+        self.uri = uri
+        self.permission = permission
+
+    def __repr__(self):
+        return 'Grant(grantee_type=%r, grantee_id=%r, display_name=%r, uri=%r, permission=%r)' % (
+            self.grantee_type, self.grantee_id, self.display_name, self.uri, self.permission)
+
+
+class Upload(object):
+    """
+    分段上传
+    属性:
+        bucket: 桶名
+        key: 对象名
+        upload_id: 上传 ID
+        initiated: 初始化时间（ISO 8601 字符串），初始化请求的响应中为 None
+    """
+    __slots__ = ('bucket', 'key', 'upload_id', 'initiated')
+
+    def __init__(self, bucket, key, upload_id, initiated=None):
+        self.bucket = bucket
+        self.key = key
+        self.upload_id = upload_id
+        self.initiated = initiated
+
+    def __repr__(self):
+        return 'Upload(bucket=%r, key=%r, upload_id=%r, initiated=%r)' % (
+            self.bucket, self.key, self.upload_id, self.initiated)
+
+
+class Part(object):
+    """
+    已上传的分段
+    属性:
+        part_number: 分段号
+        etag: 分段的 ETag
+        size: 分段大小（字节）
+        last_modified: 上传时间（ISO 8601 字符串）
+    """
+    __slots__ = ('part_number', 'etag', 'size', 'last_modified')
+
+    def __init__(self, part_number, etag, size, last_modified=None):
+        self.part_number = part_number
+        self.etag = etag
+        self.size = size
+        self.last_modified = last_modified
+
+    def __repr__(self):
+        return 'Part(part_number=%r, etag=%r, size=%r, last_modified=%r)' % (
+            self.part_number, self.etag, self.size, self.last_modified)
+
+
+class CopyResult(object):
+    """
+    服务端复制对象或分段的结果
+    属性:
+        etag: 复制得到的对象或分段的 ETag
+        last_modified: 复制完成的时间（ISO 8601 字符串）
+    """
+    __slots__ = ('etag', 'last_modified')
+
+    def __init__(self, etag, last_modified=None):
+        self.etag = etag
+        self.last_modified = last_modified
+
+    def __repr__(self):
+        return 'CopyResult(etag=%r, last_modified=%r)' % (self.etag, self.last_modified)
+
+
+def findtext(element, name):
+    """
+    查找子元素的文本，兼容带或不带 S3 命名空间的响应
+    """
+    text = element.findtext(_tag(name))
+    if text is None:
+        text = element.findtext(name)
+    return text
+
+
+def _localname(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _children(element):
+    """
+    一次遍历取出所有直接子元素的文本 {本地名: 文本}，比逐个 findtext 快
+    """
+    fields = {}
+    for child in element:
+        tag = child.tag
+        if tag[0] == '{':
+            tag = tag[tag.index('}') + 1:]
+        fields[tag] = child.text
+    return fields
+
+
+def _int(value):
+    return int(value) if value is not None else None
+
+
+def _release(element):
+    # drop the element and the siblings already handled before it, so the
+    # tree stays small however long the document is
+    element.clear()
+    while element.getprevious() is not None:
+        del element.getparent()[0]
+
+
+def _both(*names):
+    tags = []
+    for name in names:
+        tags.extend((_tag(name), name))
+    return tags
+
+
+_LIST_BUCKET_TAGS = _both('Contents', 'CommonPrefixes', 'IsTruncated', 'NextMarker')
+_LIST_VERSIONS_TAGS = _both('Version', 'DeleteMarker', 'CommonPrefixes', 'IsTruncated',
+                            'NextKeyMarker', 'NextVersionIdMarker')
+_LIST_UPLOADS_TAGS = _both('Upload', 'Bucket', 'IsTruncated', 'NextKeyMarker',
+                           'NextUploadIdMarker')
+_LIST_PARTS_TAGS = _both('Part', 'IsTruncated', 'NextPartNumberMarker')
+
+
+def iter_list_bucket(source, page):
+    """
+    增量解析 ListBucketResult，边读取边返回 ObjectSummary / CommonPrefix，
+    已处理的元素会被释放，内存占用与列表长度无关
+    参数:
+        source: 文件对象（例如 StreamingResponse）
+        page: 字典，解析结束后写入 truncated、next_marker 和 last_key
+    """
+    page['truncated'] = False
+    page['next_marker'] = None
+    page['last_key'] = None
+    for event, element in load_etree().iterparse(source, events=('end',), tag=_LIST_BUCKET_TAGS):
+        name = _localname(element.tag)
+        if name == 'Contents':
+            fields = _children(element)
+            key = fields.get('Key')
+            page['last_key'] = key
+            yield ObjectSummary(key, _int(fields.get('Size')), fields.get('ETag'),
+                                fields.get('LastModified'))
+        elif name == 'CommonPrefixes':
+            prefix = findtext(element, 'Prefix')
+            page['last_key'] = prefix
+            yield CommonPrefix(prefix)
+        elif name == 'IsTruncated':
+            page['truncated'] = element.text == 'true'
+            continue
+        elif name == 'NextMarker':
+            page['next_marker'] = element.text
+            continue
+        _release(element)
+
+
+def iter_list_versions(source, page):
+    """
+    增量解析 ListVersionsResult，边读取边返回 Version / CommonPrefix，已处理的元素会被释放
+    参数:
+        source: 文件对象（例如 StreamingResponse）
+        page: 字典，解析结束后写入 truncated、next_key_marker 和 next_version_id_marker
+    """
+    page['truncated'] = False
+    page['next_key_marker'] = None
+    page['next_version_id_marker'] = None
+    for event, element in load_etree().iterparse(source, events=('end',), tag=_LIST_VERSIONS_TAGS):
+        name = _localname(element.tag)
+        if name == 'Version' or name == 'DeleteMarker':
+            fields = _children(element)
+            yield Version(fields.get('Key'), fields.get('VersionId'),
+                          fields.get('IsLatest') == 'true', _int(fields.get('Size')),
+                          fields.get('ETag'), fields.get('LastModified'),
+                          name == 'DeleteMarker')
+        elif name == 'CommonPrefixes':
+            yield CommonPrefix(findtext(element, 'Prefix'))
+        elif name == 'IsTruncated':
+            page['truncated'] = element.text == 'true'
+            continue
+        elif name == 'NextKeyMarker':
+            page['next_key_marker'] = element.text
+            continue
+        elif name == 'NextVersionIdMarker':
+            page['next_version_id_marker'] = element.text
+            continue
+        _release(element)
+
+
+def iter_list_uploads(source, page):
+    """
+    增量解析 ListMultipartUploadsResult，逐条返回 Upload
+    参数:
+        source: 文件对象
+        page: 字典，解析结束后写入 truncated、next_key_marker 和 next_upload_id_marker
+    """
+    page['truncated'] = False
+    page['next_key_marker'] = None
+    page['next_upload_id_marker'] = None
+    bucket = None
+    for event, element in load_etree().iterparse(source, events=('end',), tag=_LIST_UPLOADS_TAGS):
+        name = _localname(element.tag)
+        if name == 'Upload':
+            fields = _children(element)
+            yield Upload(bucket, fields.get('Key'), fields.get('UploadId'),
+                         fields.get('Initiated'))
+            _release(element)
+        elif name == 'Bucket':
+            bucket = element.text
+        elif name == 'IsTruncated':
+            page['truncated'] = element.text == 'true'
+        elif name == 'NextKeyMarker':
+            page['next_key_marker'] = element.text
+        elif name == 'NextUploadIdMarker':
+            page['next_upload_id_marker'] = element.text
+
+
+def iter_list_parts(source, page):
+    """
+    增量解析 ListPartsResult，逐条返回 Part
+    参数:
+        source: 文件对象
+        page: 字典，解析结束后写入 truncated 和 next_part_number_marker
+    """
+    page['truncated'] = False
+    page['next_part_number_marker'] = None
+    for event, element in load_etree().iterparse(source, events=('end',), tag=_LIST_PARTS_TAGS):
+        name = _localname(element.tag)
+        if name == 'Part':
+            fields = _children(element)
+            yield Part(_int(fields.get('PartNumber')), fields.get('ETag'),
+                       _int(fields.get('Size')), fields.get('LastModified'))
+            _release(element)
+        elif name == 'IsTruncated':
+            page['truncated'] = element.text == 'true'
+        elif name == 'NextPartNumberMarker':
+            page['next_part_number_marker'] = _int(element.text)
+
+
+# ACL documents are small, precompiled XPath expressions avoid building
+# the namespaced paths on every call; compiled on first use with lxml
+_ACL_XPATHS = None
+_XSI_TYPE = '{http://www.w3.org/2001/XMLSchema-instance}type'
+
+
+def parse_acl(xml):
+    """
+    解析 AccessControlPolicy，返回 (所有者 ID, [Grant, ...])
+    """
+    global _ACL_XPATHS
+    etree = load_etree()
+    if _ACL_XPATHS is None:
+        _ACL_XPATHS = (etree.XPath("/*/*[local-name()='Owner']/*[local-name()='ID']/text()"),
+                       etree.XPath("//*[local-name()='Grant']"))
+    owner_id, grants_path = _ACL_XPATHS
+    root = etree.fromstring(xml)
+    owner = owner_id(root)
+    grants = []
+    for element in grants_path(root):
+        grantee = None
+        permission = None
+        for child in element:
+            name = _localname(child.tag)
+            if name == 'Grantee':
+                grantee = child
+            elif name == 'Permission':
+                permission = child.text
+        fields = _children(grantee) if grantee is not None else {}
+        grantee_type = grantee.get(_XSI_TYPE) if grantee is not None else None
+        grants.append(Grant(grantee_type, fields.get('ID'), fields.get('DisplayName'),
+                            fields.get('URI'), permission))
+    return owner[0] if owner else None, grants
+
+
+def parse_initiate_multipart(xml):
+    """
+    解析 InitiateMultipartUploadResult，返回 Upload
+    """
+    fields = _children(load_etree().fromstring(xml))
+    return Upload(fields.get('Bucket'), fields.get('Key'), fields.get('UploadId'))
+
+
+def parse_copy_result(xml):
+    """
+    解析 CopyObjectResult / CopyPartResult，返回 CopyResult；
+    复制失败时服务端可能在 200 响应中返回 Error，此时返回 None
+    """
+    root = load_etree().fromstring(xml)
+    if _localname(root.tag) == 'Error':
+        return None
+    fields = _children(root)
+    return CopyResult(fields.get('ETag'), fields.get('LastModified'))
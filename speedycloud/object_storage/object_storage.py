@@ -1,18 +1,113 @@
 # -*- coding: utf-8 -*-
 
 import os
+import time
+import base64
+import hashlib
 import urllib
-from lxml import etree
+from cStringIO import StringIO
+from xml.sax.saxutils import escape
 
-from speedycloud.object_storage import AbstractProductAPI
+from speedycloud.object_storage import DEFAULT_HOST, AbstractProductAPI, ProductAPIError
+from speedycloud.object_storage.cache import CacheEntry
+from speedycloud.object_storage.compression import ENCODINGS, DecodingResponse, decompress
+from speedycloud.object_storage.integrity import (
+    HashingReader, content_md5, etag_md5, memory_md5, verify_etag)
+from speedycloud.object_storage.models import (
+    S3_NS, findtext, iter_list_bucket, iter_list_parts, iter_list_uploads, iter_list_versions,
+    load_etree, parse_acl, parse_copy_result, parse_initiate_multipart)
+from speedycloud.object_storage.streams import format_range, iter_body, write_chunks
+from speedycloud.object_storage.transfer import (
+    DEFAULT_COPY_PART_SIZE, DEFAULT_MULTIPART_THRESHOLD, DEFAULT_PART_SIZE, DEFAULT_WORKERS,
+    MAX_OBJECT_SIZE, MAX_PART_SIZE, MultipartCopier, MultipartUploader, RangeDownloader,
+    choose_part_size, min_part_size)
+from speedycloud.object_storage.workers import WorkerPool
+
+MAX_DELETE_KEYS = 1000
 
 
 class ObjectStorageAPI(AbstractProductAPI):
+    """
+    对象存储 API
+    参数:
+        access_key: 访问秘钥
+        secret_key: 私有秘钥
+        protocol: 'http' 或 'https'
+        retry_policy: 重试策略，默认为 RetryPolicy()
+        cache: LRUCache 或 DiskCache 实例，缓存对象列表、ACL 和版本控制信息，
+            过期后通过 If-None-Match/If-Modified-Since 验证；None 表示不缓存
+        download_cache: DownloadCache 实例，供 download_object_cached 使用
+        host: 服务地址（主机名，可以带端口），使用 path 方式访问
+        endpoints: EndpointRouter 实例，在多个服务地址之间分配请求，指定后忽略 host 和 protocol
+    """
     BASE_PATH = '/'
 
+    def __init__(self, access_key, secret_key, protocol='http', retry_policy=None, cache=None,
+                 download_cache=None, host=DEFAULT_HOST, endpoints=None):
+        super(ObjectStorageAPI, self).__init__(access_key, secret_key, protocol, retry_policy,
+                                               host, endpoints)
+        self.cache = cache
+        self.download_cache = download_cache
+        # check uploaded and downloaded data against the ETag returned by
+        # the server, the MD5 is computed while the data streams through
+        self.verify_integrity = True
+        # optional Compression, objects are compressed on upload and
+        # decompressed on download according to their Content-Encoding
+        self.compression = None
+
     def _get_path(self, suffix):
         return "%s%s" % (self.BASE_PATH, suffix)
 
+    def send(self, method, path, data, params, stream=False):
+        if self.cache is not None and method in ('PUT', 'POST', 'DELETE'):
+            self._invalidate(path)
+        return super(ObjectStorageAPI, self).send(method, path, data, params, stream)
+
+    def _invalidate(self, path):
+        path = urllib.unquote(path)
+        resource, _, query = path.partition('?')
+        parts = resource.lstrip('/').split('/', 1)
+        bucket_path = self._get_path(parts[0])
+        if len(parts) == 1 or not parts[1]:
+            # bucket level change (ACL, versioning, multi-object delete);
+            # the separators keep other buckets sharing the name as a prefix
+            self.cache.invalidate_prefix(bucket_path + '?')
+            self.cache.invalidate_prefix(bucket_path + '/')
+            return
+        # an object changed: drop the bucket listings and the entries of
+        # the object itself, e.g. its ACL
+        self.cache.invalidate_prefix(bucket_path + '?')
+        self.cache.invalidate_prefix(resource)
+
+    def _cached_get(self, path):
+        """
+        带缓存的 GET，缓存未过期时直接返回，过期后发送条件请求，304 时复用缓存内容
+        """
+        cache = self.cache
+        if cache is None:
+            return self.get(path)
+        key = urllib.unquote(path)
+        entry = cache.get(key)
+        now = time.time()
+        if entry is not None and entry.fresh(now):
+            return entry.body
+        params = {}
+        if entry is not None:
+            if entry.etag:
+                params['if_none_match'] = entry.etag
+            if entry.last_modified:
+                params['if_modified_since'] = entry.last_modified
+        resp = self.send('GET', path, None, params)
+        body = resp.body
+        if resp.status == 304 and entry is not None:
+            entry.expires = now + cache.ttl
+            cache.set(key, entry)
+            return entry.body
+        if resp.status == 200:
+            cache.set(key, CacheEntry(body, resp.getheader('etag'),
+                                      resp.getheader('last-modified'), now + cache.ttl))
+        return body
+
     def list(self, bucket, prefix=""):
         """
         查询桶内对象列表
@@ -21,7 +116,68 @@ class ObjectStorageAPI(AbstractProductAPI):
         注意： bucket参数为''时，可查看所有桶
         """
         path = self._get_path('%s?prefix=%s' % (bucket, prefix))
-        return self.get(path)
+        return self._cached_get(path)
+
+    def _list_page(self, bucket, prefix, marker, delimiter, max_keys):
+        query = 'prefix=%s&marker=%s&max-keys=%d' % (
+            urllib.quote(prefix, safe=''), urllib.quote(marker, safe=''), max_keys)
+        if delimiter:
+            query += '&delimiter=%s' % urllib.quote(delimiter, safe='')
+        path = self._get_path('%s?%s' % (bucket, query))
+        resp = self.get(path, stream=True)
+        if resp.status != 200:
+            body = resp.read()
+            raise ProductAPIError('GET %s failed: %s %s %s' % (path, resp.status, resp.reason, body))
+        return resp
+
+    def _read_list_page(self, bucket, prefix, marker, delimiter, max_keys):
+        return StringIO(self._list_page(bucket, prefix, marker, delimiter, max_keys).read())
+
+    def iter_objects(self, bucket, prefix='', delimiter=None, page_size=1000, prefetch=False):
+        """
+        遍历桶内对象，自动翻页，逐条返回 ObjectSummary
+        参数:
+            bucket: 桶名
+            prefix: 对象名前缀
+            delimiter: 分隔符，指定后公共前缀以 CommonPrefix 返回
+            page_size: 每页的对象数，最大 1000
+            prefetch: 为 True 时在处理当前页的同时在后台获取下一页
+        注意：每页边下载边解析，内存占用与桶内对象数量无关
+        """
+        marker = ''
+        pending = None
+        pool = None
+        try:
+            while True:
+                page = {}
+                if pending is not None:
+                    source = pending.result()
+                else:
+                    source = self._list_page(bucket, prefix, marker, delimiter, page_size)
+                # closed even when the caller stops early or parsing fails,
+                # otherwise the page's connection never returns to the pool
+                try:
+                    records = iter_list_bucket(source, page)
+                    if prefetch:
+                        # parse the whole page first so the next one can be
+                        # requested while the caller consumes this one
+                        records = list(records)
+                        if page['truncated']:
+                            if pool is None:
+                                pool = WorkerPool(1)
+                            pending = pool.submit(
+                                self._read_list_page, bucket, prefix,
+                                page['next_marker'] or page['last_key'], delimiter, page_size)
+                    for record in records:
+                        yield record
+                finally:
+                    source.close()
+                if not page['truncated']:
+                    return
+                marker = page['next_marker'] or page['last_key']
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False)
 
     def get_services(self):
         """
@@ -57,7 +213,7 @@ class ObjectStorageAPI(AbstractProductAPI):
             bucket: 桶名
         """
         path = self._get_path('%s?acl' % bucket)
-        return self.get(path)
+        return self._cached_get(path)
 
     def query_object_acl(self, bucket, key):
         """
@@ -67,7 +223,24 @@ class ObjectStorageAPI(AbstractProductAPI):
             key: 对象名
         """
         path = self._get_path('%s/%s?acl' % (bucket, key))
-        return self.get(path)
+        return self._cached_get(path)
+
+    def query_bucket_grants(self, bucket):
+        """
+        查询桶的权限，返回 Grant 列表
+        参数:
+            bucket: 桶名
+        """
+        return parse_acl(self.query_bucket_acl(bucket))[1]
+
+    def query_object_grants(self, bucket, key):
+        """
+        查询桶内对象的权限，返回 Grant 列表
+        参数:
+            bucket: 桶名
+            key: 对象名
+        """
+        return parse_acl(self.query_object_acl(bucket, key))[1]
 
     def delete_object_data(self, bucket, key):
         """
@@ -112,7 +285,7 @@ class ObjectStorageAPI(AbstractProductAPI):
         返回桶的状态（"Enabled"或者"Suspended"或者""）
         """
         path = self._get_path("%s?versioning" % bucket)
-        return self.get(path)
+        return self._cached_get(path)
 
     def get_object_versions(self, bucket):
         """
@@ -121,6 +294,39 @@ class ObjectStorageAPI(AbstractProductAPI):
         path = self._get_path("%s?versions" % bucket)
         return self.get(path)
 
+    def iter_object_versions(self, bucket, prefix='', page_size=1000):
+        """
+        遍历桶内对象的所有版本，自动翻页，逐条返回 Version（包括删除标记）
+        参数:
+            bucket: 桶名
+            prefix: 对象名前缀
+            page_size: 每页的版本数，最大 1000
+        注意：每页边下载边解析，内存占用与版本数量无关
+        """
+        key_marker = version_id_marker = ''
+        while True:
+            query = 'versions&prefix=%s&max-keys=%d' % (urllib.quote(prefix, safe=''), page_size)
+            if key_marker:
+                query += '&key-marker=%s' % urllib.quote(key_marker, safe='')
+            if version_id_marker:
+                query += '&version-id-marker=%s' % urllib.quote(version_id_marker, safe='')
+            path = self._get_path('%s?%s' % (bucket, query))
+            resp = self.get(path, stream=True)
+            if resp.status != 200:
+                body = resp.read()
+                raise ProductAPIError('GET %s failed: %s %s %s' % (
+                    path, resp.status, resp.reason, body))
+            page = {}
+            try:
+                for version in iter_list_versions(resp, page):
+                    yield version
+            finally:
+                resp.close()
+            if not page['truncated'] or not page['next_key_marker']:
+                return
+            key_marker = page['next_key_marker']
+            version_id_marker = page['next_version_id_marker'] or ''
+
     def download_object_data(self, bucket, key):
         """
         下载桶内对象的数据
@@ -129,7 +335,160 @@ class ObjectStorageAPI(AbstractProductAPI):
             key: 对象名
         """
         path = self._get_path('%s/%s' % (bucket, key))
-        return self.get(path)
+        if self.compression is None:
+            return self.get(path)
+        resp = self.send('GET', path, None, {})
+        encoding = resp.getheader('content-encoding')
+        if resp.status == 200 and encoding in ENCODINGS:
+            return decompress(resp.body, encoding)
+        return resp.body
+
+    def download_object_cached(self, bucket, key):
+        """
+        通过本地磁盘缓存下载桶内对象，缓存命中且服务端确认未修改（304）时不传输数据
+        参数:
+            bucket: 桶名
+            key: 对象名
+        返回只读 mmap，可按字符串切片读取；空对象返回空字符串
+        注意：需要在创建 ObjectStorageAPI 时指定 download_cache
+        """
+        if self.download_cache is None:
+            raise ProductAPIError('download_cache is not configured')
+        return self.download_cache.get(self, bucket, key)
+
+    def head_object(self, bucket, key):
+        """
+        查询桶内对象的元数据
+        参数:
+            bucket: 桶名
+            key: 对象名
+        返回响应头字典，例如 content-length、etag、last-modified
+        """
+        path = self._get_path('%s/%s' % (bucket, urllib.quote(key)))
+        resp = self.head(path)
+        resp.close()
+        if resp.status != 200:
+            raise ProductAPIError('HEAD %s failed: %s %s' % (path, resp.status, resp.reason))
+        return dict(resp.headers)
+
+    def download_object_stream(self, bucket, key, byte_range=None):
+        """
+        流式下载桶内对象的数据
+        参数:
+            bucket: 桶名
+            key: 对象名
+            byte_range: 读取范围 (起始, 结束)，包含结束位置；(起始,) 表示读到对象末尾
+        返回 StreamingResponse，迭代得到数据块，读取完毕后连接自动归还连接池
+        注意：设置了 compression 时，完整下载的压缩对象自动解压
+        """
+        resp = self._object_stream(bucket, key, byte_range)
+        if byte_range is not None:
+            return resp
+        return self._decode(resp)
+
+    def _object_stream(self, bucket, key, byte_range=None):
+        params = {}
+        if byte_range is not None:
+            params['range'] = format_range(*byte_range)
+        path = self._get_path('%s/%s' % (bucket, urllib.quote(key)))
+        resp = self.get(path, params=params, stream=True)
+        if resp.status not in (200, 206):
+            body = resp.read()
+            raise ProductAPIError('GET %s failed: %s %s %s' % (path, resp.status, resp.reason, body))
+        return resp
+
+    def download_object_to_file(self, bucket, key, target, byte_range=None):
+        """
+        流式下载桶内对象，直接写入文件
+        参数:
+            bucket: 桶名
+            key: 对象名
+            target: 文件的路径、文件对象或文件描述符
+            byte_range: 读取范围，同 download_object_stream
+        返回写入的字节数
+        注意：下载完整对象时按 ETag 校验内容的 MD5，不一致时抛出 IntegrityError；
+            设置了 compression 时压缩对象解压后写入
+        """
+        resp = self._object_stream(bucket, key, byte_range)
+        try:
+            if byte_range is not None:
+                return write_chunks(resp, target)
+            reader = None
+            if self.verify_integrity and etag_md5(resp.getheader('etag')) is not None:
+                reader = HashingReader(resp)
+            written = write_chunks(iter_body(self._decode(resp, reader)), target)
+            if reader is not None:
+                verify_etag(reader.hexdigest(), resp.getheader('etag'), 'GET %s/%s' % (bucket, key))
+            return written
+        finally:
+            # a failed write or decode leaves the body unread, close it so
+            # the connection is not left checked out
+            resp.close()
+
+    def _decode(self, resp, source=None):
+        """
+        设置了 compression 且响应带有 Content-Encoding 时返回边读取边解压的响应
+        参数:
+            resp: StreamingResponse
+            source: 读取压缩数据的对象，默认为 resp
+        """
+        encoding = resp.getheader('content-encoding')
+        if self.compression is None or encoding not in ENCODINGS:
+            return source if source is not None else resp
+        return DecodingResponse(resp, encoding, source)
+
+    def presigned_get_url(self, bucket, key, expires_in=3600):
+        """
+        生成下载对象的预签名 URL
+        参数:
+            bucket: 桶名
+            key: 对象名
+            expires_in: 有效期（秒）
+        """
+        path = self._get_path('%s/%s' % (bucket, urllib.quote(key)))
+        return self.presign('GET', path, expires_in)
+
+    def presigned_put_url(self, bucket, key, expires_in=3600, header_params=None):
+        """
+        生成上传对象的预签名 URL
+        参数:
+            bucket: 桶名
+            key: 对象名
+            expires_in: 有效期（秒）
+            header_params: 参与签名的请求头参数，例如 {'content_type': 'image/png',
+                'x-amz-acl': 'public-read'}，上传时必须带上相同的请求头
+        """
+        path = self._get_path('%s/%s' % (bucket, urllib.quote(key)))
+        return self.presign('PUT', path, expires_in, header_params)
+
+    def presigned_upload_part_url(self, bucket, key, part_number, upload_id, expires_in=3600):
+        """
+        生成上传分段的预签名 URL，分段上传的初始化和完成仍由持有密钥的一方调用
+        参数:
+            bucket: 桶名
+            key: 对象名
+            part_number: 分段号
+            upload_id: 上传大数据第一步返回的uploadID
+            expires_in: 有效期（秒）
+        """
+        path = self._get_path('%s/%s?partNumber=%s&uploadId=%s' % (
+            bucket, urllib.quote(key), int(part_number), str(upload_id)))
+        return self.presign('PUT', path, expires_in)
+
+    def download_object_parallel(self, bucket, key, file_path, part_size=DEFAULT_PART_SIZE,
+                                 workers=DEFAULT_WORKERS):
+        """
+        将对象切分为多个字节范围并发下载到本地文件
+        参数:
+            bucket: 桶名
+            key: 对象名
+            file_path: 本地文件的路径
+            part_size: 每个范围的大小（字节），默认 20MB
+            workers: 并发下载的线程数
+        返回对象大小
+        """
+        downloader = RangeDownloader(self, bucket, key, part_size=part_size, workers=workers)
+        return downloader.download_file(file_path)
 
     def update_bucket_acl(self, bucket, header_params=None):
         """
@@ -197,20 +556,210 @@ class ObjectStorageAPI(AbstractProductAPI):
         参数:
             bucket: 桶名
             key: 对象名
-            update_data: 对象的内容（文件的路径/字符串）
-            update_type: 对象内容类型 允许值 'file','string'
+            update_data: 对象的内容（文件的路径/字符串/文件对象、迭代器、mmap 或 memoryview）
+            update_type: 对象内容类型 允许值 'file','string','stream'
+            header_params: 请求头参数，迭代器需要通过 {'content_length': 长度} 指定长度
+        注意：'file' 和 'stream' 类型按块发送，不会将整个文件读入内存
         """
-        global update_content
         if header_params is None:
             header_params = {}
         path = self._get_path('%s/%s' % (bucket, urllib.quote(key)))
-        if update_type == 'data':
-            update_content = update_data
         if update_type == 'file':
-            update_content = open(str(update_data), 'rb').read()
-        elif update_type == 'string':
-            update_content = update_data
-        return self.put(path, update_content, params=header_params)
+            with open(str(update_data), 'rb') as f:
+                return self._put_object_data(path, f, header_params).body
+        return self._put_object_data(path, update_data, header_params).body
+
+    def put_object(self, bucket, key, data, header_params=None, compress=True):
+        """
+        上传对象，失败时抛出 ProductAPIError
+        参数:
+            bucket: 桶名
+            key: 对象名
+            data: 对象的内容（字符串、文件对象、迭代器、mmap 或 memoryview）
+            header_params: 请求头参数
+            compress: 为 False 时即使设置了 compression 也按原样上传
+        返回新对象的 ETag
+        """
+        if header_params is None:
+            header_params = {}
+        path = self._get_path('%s/%s' % (bucket, urllib.quote(key)))
+        if compress:
+            resp = self._put_object_data(path, data, header_params)
+        else:
+            resp = self._put_checked(path, data, header_params)
+        if resp.status != 200:
+            raise ProductAPIError('PUT %s failed: %s %s %s' % (
+                path, resp.status, resp.reason, resp.body))
+        return resp.getheader('etag')
+
+    def copy_object(self, src_bucket, src_key, bucket, key, header_params=None):
+        """
+        在服务端复制对象，数据不经过本地；单次复制的对象不能超过 5GB，更大的对象使用 copy
+        参数:
+            src_bucket: 源桶名
+            src_key: 源对象名
+            bucket: 目标桶名
+            key: 目标对象名
+            header_params: 请求头参数，默认复制源对象的元数据；替换元数据时指定
+                {'x-amz-metadata-directive': 'REPLACE', 'content_type': ..., 'x-amz-meta-...': ...}
+        返回新对象的 ETag
+        """
+        params = dict(header_params or {})
+        params['x-amz-copy-source'] = self._copy_source(src_bucket, src_key)
+        path = self._get_path('%s/%s' % (bucket, urllib.quote(key)))
+        return self._copy_request(path, params).etag
+
+    @staticmethod
+    def _copy_source(bucket, key):
+        return '/%s/%s' % (bucket, urllib.quote(key))
+
+    def _copy_request(self, path, params):
+        """
+        发送复制请求，返回 CopyResult；复制失败时服务端也可能返回 200，错误在响应内容中
+        """
+        resp = self.send('PUT', path, None, params)
+        result = None
+        if resp.status == 200 and resp.body:
+            result = parse_copy_result(resp.body)
+        if result is None:
+            raise ProductAPIError('PUT %s failed: %s %s %s' % (
+                path, resp.status, resp.reason, resp.body))
+        return result
+
+    def _put_object_data(self, path, data, params):
+        """
+        上传对象内容，设置了 compression 时按需压缩
+        """
+        if self.compression is None:
+            return self._put_checked(path, data, params)
+        body, params = self.compression.encode(data, params)
+        try:
+            return self._put_checked(path, body, params)
+        finally:
+            if body is not data and hasattr(body, 'close'):
+                body.close()
+
+    def _put_checked(self, path, data, params):
+        """
+        上传对象或分段，内存中的内容附带 Content-MD5，文件对象在发送的同时计算 MD5，
+        成功后与服务端返回的 ETag 比较，不一致时抛出 IntegrityError
+        """
+        if not self.verify_integrity or data is None:
+            return self.send('PUT', path, data, params)
+        reader = expected = None
+        if hasattr(data, 'read'):
+            data = reader = HashingReader(data)
+        elif hasattr(data, '__len__'):
+            md5 = memory_md5(data)
+            expected = md5.hexdigest()
+            if 'content_md5' not in params:
+                params = dict(params, content_md5=content_md5(md5))
+        # iterators are sent as they are, there is nothing to rewind and hash
+        resp = self.send('PUT', path, data, params)
+        if reader is not None:
+            expected = reader.hexdigest()
+        if resp.status == 200:
+            verify_etag(expected, resp.getheader('etag'), 'PUT %s' % path)
+        return resp
+
+    def delete_objects(self, bucket, keys, quiet=True):
+        """
+        批量删除桶内对象，每个请求最多删除 1000 个对象
+        参数:
+            bucket: 桶名
+            keys: 对象名列表
+            quiet: 为 True 时服务端只返回删除失败的对象
+        返回 (deleted, errors)
+            deleted: 删除成功的对象名列表
+            errors: {对象名: 错误信息}
+        """
+        keys = list(keys)
+        errors = {}
+        path = self._get_path('%s?delete' % bucket)
+        for i in range(0, len(keys), MAX_DELETE_KEYS):
+            batch = keys[i:i + MAX_DELETE_KEYS]
+            body = '<Delete><Quiet>%s</Quiet>%s</Delete>' % (
+                quiet and 'true' or 'false',
+                ''.join('<Object><Key>%s</Key></Object>' % escape(k) for k in batch))
+            params = {
+                'content_md5': base64.b64encode(hashlib.md5(body).digest()),
+                'content_type': 'application/xml',
+            }
+            resp = self.post(path, data=body, params=params, stream=True)
+            xml = resp.read()
+            if resp.status != 200:
+                for k in batch:
+                    errors[k] = '%s %s' % (resp.status, resp.reason)
+                continue
+            root = load_etree().fromstring(xml)
+            for error in root.iter('{%s}Error' % S3_NS, 'Error'):
+                errors[findtext(error, 'Key')] = '%s: %s' % (
+                    findtext(error, 'Code'), findtext(error, 'Message'))
+        deleted = [k for k in keys if k not in errors]
+        return deleted, errors
+
+    def _fan_out(self, fn, items, concurrency):
+        results = {}
+        errors = {}
+        futures = []
+        pool = WorkerPool(concurrency, max_pending=0)
+        try:
+            for key, args in items:
+                futures.append((key, pool.submit(fn, *args)))
+        finally:
+            pool.shutdown()
+        for key, future in futures:
+            exception = future.exception()
+            if exception is not None:
+                errors[key] = exception
+            else:
+                results[key] = future.result()
+        return results, errors
+
+    def _get_object(self, bucket, key):
+        return self.download_object_stream(bucket, key).read()
+
+    def bulk_get(self, bucket, keys, concurrency=DEFAULT_WORKERS):
+        """
+        并发下载多个对象
+        参数:
+            bucket: 桶名
+            keys: 对象名列表
+            concurrency: 并发数
+        返回 (results, errors)
+            results: {对象名: 对象内容}
+            errors: {对象名: 异常}，单个对象失败不影响其他对象
+        """
+        return self._fan_out(self._get_object,
+                             [(k, (bucket, k)) for k in keys], concurrency)
+
+    def _put_object(self, bucket, key, data, header_params):
+        path = self._get_path('%s/%s' % (bucket, urllib.quote(key)))
+        resp = self._put_object_data(path, data, dict(header_params))
+        if resp.status != 200:
+            raise ProductAPIError('PUT %s failed: %s %s %s' % (
+                path, resp.status, resp.reason, resp.body))
+        return resp.getheader('etag', '')
+
+    def bulk_put(self, bucket, items, concurrency=DEFAULT_WORKERS, header_params=None):
+        """
+        并发上传多个对象
+        参数:
+            bucket: 桶名
+            items: {对象名: 对象内容} 或 [(对象名, 对象内容), ...]，内容为字符串或文件对象
+            concurrency: 并发数
+            header_params: 请求头参数，对所有对象生效
+        返回 (results, errors)
+            results: {对象名: etag}
+            errors: {对象名: 异常}，单个对象失败不影响其他对象
+        """
+        if header_params is None:
+            header_params = {}
+        if isinstance(items, dict):
+            items = items.items()
+        return self._fan_out(self._put_object,
+                             [(k, (bucket, k, data, header_params)) for k, data in items],
+                             concurrency)
 
     def initiate_multipart_upload(self, bucket, key, params=None):
         """
@@ -221,11 +770,14 @@ class ObjectStorageAPI(AbstractProductAPI):
         """
         if params is None:
             params = {}
-        path = self._get_path('%s/%s?uploads' % (bucket, key))
-        xml = self.post(path, params=params)
-        root = etree.fromstring(xml)
-        upload_id = root.find(
-            ".//{http://s3.amazonaws.com/doc/2006-03-01/}UploadId").text
+        path = self._get_path('%s/%s?uploads' % (bucket, urllib.quote(key)))
+        resp = self.send('POST', path, None, params)
+        upload_id = None
+        if resp.status == 200 and resp.body:
+            upload_id = parse_initiate_multipart(resp.body).upload_id
+        if not upload_id:
+            raise ProductAPIError('POST %s failed: %s %s %s' % (
+                path, resp.status, resp.reason, resp.body))
         return upload_id
 
     def upload_part(self, bucket, key, update_data, part_number, upload_id):
@@ -234,16 +786,104 @@ class ObjectStorageAPI(AbstractProductAPI):
         参数:
             bucket: 桶名
             key: 对象名
-            update_data: 对象的内容（文件的路径/字符串）
-            update_type: 对象内容类型 允许值 'file','string'
+            update_data: 分段的内容（字符串/文件对象/FileSlice/mmap 等）
             part_number: 上传的第几部分，分几部分就运行几次本函数
             upload_id: 上传大数据第一步返回的uploadID
-        注意：将返回的etag保存，在大数据上传第三步使用
+        注意：将返回的etag保存，在大数据上传第三步使用；分段内容的 MD5 与 etag 不一致时
+            抛出 IntegrityError
         """
         path = self._get_path('%s/%s?partNumber=%s&uploadId=%s' % (
-            bucket, key, int(part_number), str(upload_id)))
-        request, header = self.upload_big_data_put(path, update_data)
-        return self.parse_header(header)
+            bucket, urllib.quote(key), int(part_number), str(upload_id)))
+        resp = self._put_checked(path, update_data, {})
+        if resp.status != 200:
+            raise ProductAPIError('PUT %s failed: %s %s %s' % (
+                path, resp.status, resp.reason, resp.body))
+        return resp.getheader('etag', '')
+
+    def upload_part_copy(self, bucket, key, part_number, upload_id, src_bucket, src_key,
+                         byte_range=None, if_match=None):
+        """
+        以服务端复制的方式上传分段，分段内容取自源对象，数据不经过本地
+        参数:
+            bucket: 桶名
+            key: 对象名
+            part_number: 分段号
+            upload_id: 上传大数据第一步返回的uploadID
+            src_bucket: 源桶名
+            src_key: 源对象名
+            byte_range: 源对象的字节范围 (起始, 结束)，闭区间，None 表示整个源对象
+            if_match: 源对象的 ETag，源对象已被修改时复制失败
+        返回分段的 etag，用法与 upload_part 的返回值相同
+        """
+        path = self._get_path('%s/%s?partNumber=%s&uploadId=%s' % (
+            bucket, urllib.quote(key), int(part_number), str(upload_id)))
+        params = {'x-amz-copy-source': self._copy_source(src_bucket, src_key)}
+        if byte_range is not None:
+            params['x-amz-copy-source-range'] = format_range(*byte_range)
+        if if_match is not None:
+            params['x-amz-copy-source-if-match'] = if_match
+        return self._copy_request(path, params).etag
+
+    def list_parts(self, bucket, key, upload_id):
+        """
+        查询分段上传中已上传的分段
+        参数:
+            bucket: 桶名
+            key: 对象名
+            upload_id: 上传大数据第一步返回的uploadID
+        返回 {分段号: (etag, 分段大小)}
+        """
+        parts = {}
+        marker = 0
+        while True:
+            path = self._get_path('%s/%s?uploadId=%s&part-number-marker=%d' % (
+                bucket, urllib.quote(key), str(upload_id), marker))
+            page = {}
+            for part in iter_list_parts(self._read_page(path), page):
+                parts[part.part_number] = (part.etag, part.size or 0)
+                marker = max(marker, part.part_number)
+            if not page['truncated']:
+                return parts
+            marker = page['next_part_number_marker'] or marker
+
+    def _read_page(self, path):
+        resp = self.send('GET', path, None, {})
+        if resp.status != 200:
+            raise ProductAPIError('GET %s failed: %s %s %s' % (
+                path, resp.status, resp.reason, resp.body))
+        return StringIO(resp.body)
+
+    def iter_multipart_uploads(self, bucket, prefix=''):
+        """
+        遍历桶内未完成的分段上传，自动翻页，逐条返回 Upload
+        参数:
+            bucket: 桶名
+            prefix: 对象名前缀
+        """
+        key_marker = upload_id_marker = ''
+        while True:
+            path = self._get_path('%s?uploads&prefix=%s&key-marker=%s&upload-id-marker=%s' % (
+                bucket, urllib.quote(prefix, safe=''), urllib.quote(key_marker, safe=''),
+                urllib.quote(upload_id_marker, safe='')))
+            page = {}
+            for upload in iter_list_uploads(self._read_page(path), page):
+                yield upload
+            if not page['truncated'] or not page['next_key_marker']:
+                return
+            key_marker = page['next_key_marker']
+            upload_id_marker = page['next_upload_id_marker'] or ''
+
+    def abort_multipart_upload(self, bucket, key, upload_id):
+        """
+        取消分段上传，释放已上传的分段
+        参数:
+            bucket: 桶名
+            key: 对象名
+            upload_id: 上传大数据第一步返回的uploadID
+        """
+        path = self._get_path('%s/%s?uploadId=%s' % (
+            bucket, urllib.quote(key), str(upload_id)))
+        return self.delete(path)
 
     @staticmethod
     def parse_header(header):
@@ -258,48 +898,119 @@ class ObjectStorageAPI(AbstractProductAPI):
         参数:
             bucket: 桶名
             key: 对象名
-            update_data: 对象的内容（文件的路径/字符串）
-            update_type: 对象内容类型 允许值 'file','string'
+            update_data: 对象的内容（文件的路径/字符串/文件对象）
+            update_type: 对象内容类型 允许值 'file','string','stream'
             upload_id: 上传大数据第一步返回的uploadID
         """
-        global update_content
         path = self._get_path('%s/%s?uploadId=%s' %
-                              (bucket, key, str(upload_id)))
+                              (bucket, urllib.quote(key), str(upload_id)))
         if update_type == 'file':
-            update_content = open(str(update_data), 'rb').read()
-        elif update_type == 'string':
-            update_content = update_data
-        return self.post(path, update_content)
+            with open(str(update_data), 'rb') as f:
+                return self.post(path, f)
+        return self.post(path, update_data)
 
-    def upload_big_data(self, bucket, key, update_data, params):
+    def upload_big_data(self, bucket, key, update_data, params, part_size=DEFAULT_PART_SIZE,
+                        workers=DEFAULT_WORKERS, journal_path=None):
         """
-        上传大数据第三步,完成分段上传
+        大文件分段上传，封装接口，各分段并发上传
         参数:
             bucket: 桶名
             key: 对象名
-            update_data: 对象的内容（文件的路径/字符串）
+            update_data: 文件的路径
             params: 参数，例如 Content-Type
+            part_size: 分段大小（字节），默认 20MB，文件过大时自动放大以满足 10000 个分段的限制
+            workers: 并发上传的线程数
+            journal_path: 断点记录文件的路径，指定后中断的上传再次调用时跳过已确认的分段，
+                上传完成后记录文件被删除
+        注意：分段按原样上传，不使用 compression 压缩
+        """
+        length = os.path.getsize(update_data)
+        if length > MAX_OBJECT_SIZE:
+            raise ProductAPIError('file is bigger than %d bytes' % MAX_OBJECT_SIZE)
+        part_size = max(part_size, min_part_size(length))
+        uploader = MultipartUploader(self, bucket, key, params, part_size=part_size,
+                                     workers=workers, journal_path=journal_path)
+        return uploader.upload_file(update_data)
+
+    def upload(self, bucket, key, file_path, header_params=None,
+               multipart_threshold=DEFAULT_MULTIPART_THRESHOLD, part_size=None,
+               workers=DEFAULT_WORKERS, target_throughput=None, adaptive=False,
+               journal_path=None):
         """
-        uid = self.initiate_multipart_upload(bucket, key, params)
-        with open(update_data) as f:
-            length = os.path.getsize(update_data)
-            # DEFAULT FILE SIZE
-            if length > 64 * 1024 * 1024 * 1024:
-                print "file is bigger than 64G"
-                return
-            i = length / (1024 * 1024 * 20)
-            j = length % 1024 * 1024 * 20
-            if j != 0:
-                i += 1
-            s = ""
-            for k in range(i):
-                if k != i - 1:
-                    etag = self.upload_part(bucket, key, f.read(1024 * 1024 * 20), k + 1, uid)
-                else:
-                    etag = self.upload_part(bucket, key, f.read(length - k * 1024 * 1024 * 20),
-                                            k + 1, uid)
-                s += '<Part><PartNumber>%s</PartNumber><ETag>%s</ETag></Part>' % (k + 1, etag)
+        上传文件，小文件使用单次 PUT，大文件自动使用并发分段上传
+        参数:
+            bucket: 桶名
+            key: 对象名
+            file_path: 文件的路径
+            header_params: 请求头参数，例如 {'x-amz-acl': 'public-read'}
+            multipart_threshold: 不超过该大小（字节）的文件使用单次 PUT，默认 64MB
+            part_size: 分段大小（字节），None 时根据文件大小和 target_throughput 自动选择
+            workers: 并发上传的线程数
+            target_throughput: 单个连接预期的吞吐量（字节/秒），用于选择分段大小
+            adaptive: 为 True 时根据已完成分段的耗时调整后续分段大小
+            journal_path: 断点记录文件的路径，不能与 adaptive 同时使用
+        注意：设置了 compression 时只有单次 PUT 的小文件会被压缩，分段上传的文件按原样上传
+        """
+        if header_params is None:
+            header_params = {}
+        length = os.path.getsize(file_path)
+        if length <= min(multipart_threshold, MAX_PART_SIZE):
+            return self.storing_object_data(bucket, key, file_path, 'file', header_params)
+        if length > MAX_OBJECT_SIZE:
+            raise ProductAPIError('file is bigger than %d bytes' % MAX_OBJECT_SIZE)
+        if part_size is None:
+            part_size = choose_part_size(length, target_throughput)
+        else:
+            part_size = max(part_size, min_part_size(length))
+        uploader = MultipartUploader(self, bucket, key, header_params, part_size=part_size,
+                                     workers=workers, journal_path=journal_path,
+                                     adaptive=adaptive)
+        return uploader.upload_file(file_path)
+
+    def copy(self, src_bucket, src_key, bucket, key, header_params=None,
+             multipart_threshold=MAX_PART_SIZE, part_size=DEFAULT_COPY_PART_SIZE,
+             workers=DEFAULT_WORKERS):
+        """
+        在服务端复制对象，小对象使用单次复制，大对象自动使用并发的分段复制，数据都不经过本地
+        参数:
+            src_bucket: 源桶名
+            src_key: 源对象名
+            bucket: 目标桶名
+            key: 目标对象名
+            header_params: 目标对象的请求头参数，指定时替换源对象的元数据，None 时沿用源对象的元数据
+            multipart_threshold: 不超过该大小（字节）的对象使用单次复制，最大 5GB
+            part_size: 分段复制时的分段大小（字节）
+            workers: 并发复制的线程数
+        返回新对象的 ETag
+        """
+        source = self.head_object(src_bucket, src_key)
+        length = int(source['content-length'])
+        if length <= min(multipart_threshold, MAX_PART_SIZE):
+            if header_params is not None:
+                header_params = dict(header_params)
+                header_params.setdefault('x-amz-metadata-directive', 'REPLACE')
+            return self.copy_object(src_bucket, src_key, bucket, key, header_params)
+        copier = MultipartCopier(self, src_bucket, src_key, bucket, key, header_params,
+                                 part_size=part_size, workers=workers)
+        body = copier.copy(source)
+        return findtext(load_etree().fromstring(body), 'ETag')
 
-        s = '<CompleteMultipartUpload>' + s + '</CompleteMultipartUpload>'
-        path = self._get_path('%s/%s?uploadId=%s' % (bucket, key, uid))
-        return self.post(path, data=s, params=params)
+    def move(self, src_bucket, src_key, bucket, key, header_params=None,
+             multipart_threshold=MAX_PART_SIZE, part_size=DEFAULT_COPY_PART_SIZE,
+             workers=DEFAULT_WORKERS):
+        """
+        在服务端移动（重命名）对象：先复制再删除源对象，参数与 copy 相同
+        返回新对象的 ETag
+        注意：源对象和目标对象相同时抛出 ProductAPIError，修改元数据请使用 copy
+        """
+        if (src_bucket, src_key) == (bucket, key):
+            # the delete after the copy would remove the only copy
+            raise ProductAPIError('cannot move %s/%s onto itself' % (bucket, key))
+        etag = self.copy(src_bucket, src_key, bucket, key, header_params, multipart_threshold,
+                         part_size, workers)
+        path = self._get_path('%s/%s' % (src_bucket, urllib.quote(src_key)))
+        resp = self.send('DELETE', path, None, {})
+        if resp.status not in (200, 204):
+            raise ProductAPIError('DELETE %s failed: %s %s %s' % (
+                path, resp.status, resp.reason, resp.body))
+        return etag
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import random
+import threading
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'])
+RETRY_STATUSES = frozenset([500, 502, 503, 504])
+# statuses that mean the request was rejected before being processed, so
+# even a non idempotent request can be sent again (503 SlowDown)
+REJECTED_STATUSES = frozenset([503])
+
+
+class RetryBudget(object):
+    """
+    重试预算（令牌桶），限制客户端整体的重试比例，避免故障时重试风暴
+    参数:
+        capacity: 令牌上限，即连续失败时最多允许的重试次数
+        refill: 每次成功请求补充的令牌数，0.1 表示每 10 个成功请求换 1 次重试
+    """
+
+    def __init__(self, capacity=100, refill=0.1):
+        self.capacity = float(capacity)
+        self.refill = refill
+        self.tokens = float(capacity)
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        self.lock.acquire()
+        try:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+        finally:
+            self.lock.release()
+
+    def on_success(self):
+        self.lock.acquire()
+        try:
+            self.tokens = min(self.capacity, self.tokens + self.refill)
+        finally:
+            self.lock.release()
+
+
+class RetryPolicy(object):
+    """
+    请求重试策略：指数退避加全随机抖动，按状态码和请求方法判断是否重试
+    参数:
+        max_attempts: 每个请求最多的尝试次数（包含第一次）
+        base_delay: 退避的基础时间（秒）
+        max_delay: 单次退避的上限（秒）
+        retry_statuses: 需要重试的 HTTP 状态码
+        idempotent_methods: 可以安全重试的请求方法，其余方法只在请求未发出或被服务端拒绝（503）时重试
+        budget: RetryBudget 实例，None 表示不限制
+    """
+
+    def __init__(self, max_attempts=5, base_delay=0.1, max_delay=20,
+                 retry_statuses=RETRY_STATUSES, idempotent_methods=IDEMPOTENT_METHODS,
+                 budget=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = frozenset(retry_statuses)
+        self.idempotent_methods = frozenset(idempotent_methods)
+        self.budget = budget
+
+    def backoff(self, attempt):
+        """
+        第 attempt 次失败后的等待时间（秒），在 [0, min(max_delay, base_delay * 2^attempt)] 内随机
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def should_retry(self, method, attempt, status=None, sent=True):
+        """
+        判断第 attempt 次尝试（从 0 开始）失败后是否重试
+        参数:
+            method: 请求方法
+            attempt: 已失败的尝试序号
+            status: HTTP 状态码，连接异常时为 None
+            sent: 连接异常时请求是否已完整发出
+        """
+        if attempt + 1 >= self.max_attempts:
+            return False
+        if status is not None:
+            if status not in self.retry_statuses:
+                return False
+            if method not in self.idempotent_methods and status not in REJECTED_STATUSES:
+                return False
+        elif sent and method not in self.idempotent_methods:
+            # the server may already have acted on it
+            return False
+        if self.budget is not None and not self.budget.acquire():
+            return False
+        return True
+
+    def on_success(self):
+        if self.budget is not None:
+            self.budget.on_success()
+
+
+class NoRetry(RetryPolicy):
+    """
+    不重试
+    """
+
+    def __init__(self):
+        RetryPolicy.__init__(self, max_attempts=1)
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+
+import os
+import mmap
+
+CHUNK_SIZE = 64 * 1024
+
+try:
+    _BUFFER_TYPES = (mmap.mmap, buffer, bytearray, memoryview)
+except NameError:
+    # memoryview is new in Python 2.7
+    _BUFFER_TYPES = (mmap.mmap, buffer, bytearray)
+
+
+class FileSlice(object):
+    """
+    文件中的一段数据，以文件对象的形式按需读取，不会一次读入内存
+    参数:
+        file_path: 文件的路径
+        offset: 起始偏移量
+        length: 长度
+    """
+
+    def __init__(self, file_path, offset, length):
+        self.file_path = file_path
+        self.offset = offset
+        self.length = length
+        self.position = 0
+        self.fp = None
+
+    def __len__(self):
+        return self.length
+
+    def read(self, size=-1):
+        if self.fp is None:
+            self.fp = open(self.file_path, 'rb')
+            self.fp.seek(self.offset + self.position)
+        remaining = self.length - self.position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        data = self.fp.read(size)
+        self.position += len(data)
+        return data
+
+    def tell(self):
+        return self.position
+
+    def seek(self, position, whence=0):
+        if whence == 1:
+            position += self.position
+        elif whence == 2:
+            position += self.length
+        self.position = max(0, min(position, self.length))
+        if self.fp is not None:
+            self.fp.seek(self.offset + self.position)
+
+    def close(self):
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def is_stream(data):
+    """
+    请求体是否需要分块发送（字符串与 None 之外的类型）
+    """
+    return data is not None and not isinstance(data, basestring)
+
+
+def body_length(data):
+    """
+    计算请求体剩余的长度，无法确定时（例如迭代器）返回 None
+    """
+    if data is None:
+        return 0
+    if isinstance(data, basestring):
+        return len(data)
+    if isinstance(data, _BUFFER_TYPES):
+        return len(data)
+    if isinstance(data, FileSlice):
+        return data.length - data.position
+    if hasattr(data, 'read'):
+        try:
+            size = os.fstat(data.fileno()).st_size
+            return max(0, size - data.tell())
+        except (AttributeError, IOError, OSError, ValueError):
+            pass
+        try:
+            position = data.tell()
+            data.seek(0, 2)
+            end = data.tell()
+            data.seek(position)
+            return end - position
+        except (AttributeError, IOError, OSError, ValueError):
+            return None
+    return None
+
+
+def iter_body(data, chunk_size=CHUNK_SIZE):
+    """
+    将请求体按块返回，文件对象、mmap、memoryview 和迭代器每次只读取一块
+    """
+    if data is None:
+        return
+    if isinstance(data, (basestring,) + _BUFFER_TYPES):
+        for i in xrange(0, len(data), chunk_size):
+            chunk = data[i:i + chunk_size]
+            if hasattr(chunk, 'tobytes'):
+                chunk = chunk.tobytes()
+            yield chunk
+    elif hasattr(data, 'read'):
+        while True:
+            chunk = data.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        for chunk in data:
+            if chunk:
+                yield chunk
+
+
+def body_position(data):
+    """
+    记录请求体的当前位置，用于重试前回退；不可回退时返回 None
+    """
+    if not is_stream(data) or isinstance(data, _BUFFER_TYPES):
+        return 0
+    if hasattr(data, 'tell') and hasattr(data, 'seek'):
+        try:
+            return data.tell()
+        except (IOError, OSError, ValueError):
+            return None
+    return None
+
+
+def rewind_body(data, position):
+    """
+    将请求体回退到 body_position 记录的位置，成功返回 True
+    """
+    if position is None:
+        return False
+    if hasattr(data, 'seek') and not isinstance(data, _BUFFER_TYPES):
+        data.seek(position)
+    return True
+
+
+class Response(object):
+    """
+    已读取响应体的 HTTP 响应，每次请求独立创建，可以在线程之间安全传递
+    属性:
+        status: HTTP 状态码
+        reason: HTTP 状态描述
+        headers: 响应头列表 [(name, value), ...]
+        body: 响应内容
+    """
+    __slots__ = ('status', 'reason', 'headers', 'body')
+
+    def __init__(self, status, reason, headers, body):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def getheader(self, name, default=None):
+        name = name.lower()
+        for key, value in self.headers:
+            if key.lower() == name:
+                return value
+        return default
+
+    def read(self, amt=None):
+        # same interface as StreamingResponse for callers that accept both
+        return self.body
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class StreamingResponse(object):
+    """
+    未读取响应体的 HTTP 响应，读取完毕或关闭时将连接归还连接池
+    属性:
+        status: HTTP 状态码
+        reason: HTTP 状态描述
+        headers: 响应头列表 [(name, value), ...]
+    """
+
+    def __init__(self, response, release, rate_limiter=None):
+        self.response = response
+        self.rate_limiter = rate_limiter
+        self.bytes_read = 0
+        self.status = response.status
+        self.reason = response.reason
+        self.headers = response.getheaders()
+        self._release = release
+
+    def getheader(self, name, default=None):
+        return self.response.getheader(name, default)
+
+    def read(self, amt=None):
+        if self._release is None:
+            return ''
+        data = self.response.read(amt)
+        self.bytes_read += len(data)
+        if self.rate_limiter is not None and data:
+            self.rate_limiter.consume(len(data))
+        if amt is None or not data:
+            self.close()
+        return data
+
+    def iter_chunks(self, chunk_size=CHUNK_SIZE):
+        try:
+            while True:
+                chunk = self.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            self.close()
+
+    def __iter__(self):
+        return self.iter_chunks()
+
+    def close(self):
+        if self._release is None:
+            return
+        release, self._release = self._release, None
+        if not self.response.isclosed() and self.response.length == 0:
+            self.response.read()
+        # a connection with unread body data left on it can not be reused
+        release(self.response.isclosed())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def format_range(start, end=None):
+    """
+    生成 Range 请求头的值，end 为 None 时表示读取到对象末尾
+    """
+    if end is None:
+        return 'bytes=%d-' % start
+    return 'bytes=%d-%d' % (start, end)
+
+
+def write_chunks(chunks, target):
+    """
+    将数据块写入文件路径、文件对象或文件描述符，返回写入的字节数
+    """
+    if isinstance(target, basestring):
+        with open(target, 'wb') as f:
+            return write_chunks(chunks, f)
+    written = 0
+    for chunk in chunks:
+        if isinstance(target, (int, long)):
+            view = chunk
+            while view:
+                view = view[os.write(target, view):]
+        else:
+            target.write(chunk)
+        written += len(chunk)
+    return written
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+import os
+import copy
+import time
+import calendar
+import hashlib
+from functools import partial
+
+from speedycloud.object_storage import ProductAPIError
+from speedycloud.object_storage.compression import ENCODINGS, UNCOMPRESSED_SIZE_HEADER
+from speedycloud.object_storage.models import ObjectSummary
+from speedycloud.object_storage.streams import CHUNK_SIZE
+from speedycloud.object_storage.transfer import (
+    DEFAULT_MULTIPART_THRESHOLD, DEFAULT_PART_SIZE, MultipartUploader, RangeDownloader,
+    min_part_size)
+from speedycloud.object_storage.workers import RateLimiter, WorkerPool
+
+
+def parse_iso8601(value):
+    """
+    将列表中的 LastModified（例如 2018-06-21T10:00:00.000Z）转换为时间戳
+    """
+    if not value:
+        return 0
+    return calendar.timegm(time.strptime(value[:19], '%Y-%m-%dT%H:%M:%S'))
+
+
+def file_md5(file_path):
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class TransferManager(object):
+    """
+    目录与桶之间的增量同步
+    参数:
+        api: ObjectStorageAPI 实例
+        workers: 全局并发数，小文件和大文件的分段共用同一个任务池
+        multipart_threshold: 超过该大小（字节）的文件使用分段上传/分段并发下载
+        part_size: 分段大小（字节），上传时按文件大小自动放大以满足 10000 个分段的限制
+        bandwidth: 全局带宽上限（字节/秒），None 表示不限速
+    注意：bandwidth 只限制本实例发起的传输，传入的 api 不受影响；
+        上传的文件不压缩（忽略 api.compression），以便按大小和 ETag 比较
+    """
+
+    def __init__(self, api, workers=8, multipart_threshold=DEFAULT_MULTIPART_THRESHOLD,
+                 part_size=DEFAULT_PART_SIZE, bandwidth=None):
+        if bandwidth is not None:
+            # a shallow copy shares the pool, caches and hooks with the
+            # caller's client but keeps the limiter to this manager
+            api = copy.copy(api)
+            api.rate_limiter = RateLimiter(bandwidth)
+        self.api = api
+        self.workers = workers
+        self.multipart_threshold = multipart_threshold
+        self.part_size = part_size
+
+    def _remote_objects(self, bucket, prefix):
+        objects = {}
+        for record in self.api.iter_objects(bucket, prefix):
+            # the parser returns non-ASCII keys as unicode, local paths and
+            # request paths are UTF-8 byte strings
+            if isinstance(record.key, unicode):
+                record.key = record.key.encode('utf-8')
+            objects[record.key] = record
+        return objects
+
+    @staticmethod
+    def _local_files(local_dir):
+        for root, dirs, files in os.walk(local_dir):
+            dirs.sort()
+            for name in sorted(files):
+                file_path = os.path.join(root, name)
+                rel_path = os.path.relpath(file_path, local_dir)
+                yield file_path, rel_path.replace(os.sep, '/')
+
+    @staticmethod
+    def upload_needed(file_path, stat, remote):
+        """
+        判断本地文件是否需要上传：远端不存在、大小不同，
+        或本地更新且内容的 MD5 与远端 ETag 不同
+        """
+        if remote is None or remote.size != stat.st_size:
+            return True
+        if stat.st_mtime <= parse_iso8601(remote.last_modified):
+            return False
+        etag = (remote.etag or '').strip('"')
+        if not etag or '-' in etag:
+            # multipart ETags are not a plain MD5 of the content
+            return True
+        return file_md5(file_path) != etag
+
+    @staticmethod
+    def download_needed(file_path, remote):
+        """
+        判断远端对象是否需要下载：本地不存在、大小不同或远端更新
+        """
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return True
+        if stat.st_size != remote.size:
+            return True
+        return parse_iso8601(remote.last_modified) > stat.st_mtime
+
+    def _download_needed(self, bucket, file_path, remote):
+        if not self.download_needed(file_path, remote):
+            return False
+        if self.api.compression is None or not os.path.exists(file_path):
+            return True
+        # objects compressed on upload are listed with their compressed size,
+        # the local copy has the original one
+        headers = self.api.head_object(bucket, remote.key)
+        size = headers.get(UNCOMPRESSED_SIZE_HEADER)
+        if headers.get('content-encoding') not in ENCODINGS or size is None:
+            return True
+        return self.download_needed(file_path, ObjectSummary(
+            remote.key, int(size), remote.etag, remote.last_modified))
+
+    def _run(self, tasks):
+        result = {'transferred': [], 'skipped': 0, 'errors': {}}
+        futures = []
+        pool = WorkerPool(self.workers)
+        try:
+            for name, size, small, large in tasks:
+                if small is None:
+                    result['skipped'] += 1
+                    continue
+                if size > self.multipart_threshold:
+                    # parts of a large file go through the same pool as the
+                    # small files, so the concurrency budget stays global
+                    try:
+                        large(pool)
+                        result['transferred'].append(name)
+                    except Exception, e:
+                        result['errors'][name] = e
+                else:
+                    futures.append((name, pool.submit(small)))
+        finally:
+            pool.shutdown()
+        for name, future in futures:
+            exception = future.exception()
+            if exception is not None:
+                result['errors'][name] = exception
+            else:
+                result['transferred'].append(name)
+        return result
+
+    def upload_dir(self, local_dir, bucket, prefix=''):
+        """
+        将本地目录同步到桶内，只上传新增或变化的文件
+        参数:
+            local_dir: 本地目录
+            bucket: 桶名
+            prefix: 对象名前缀，例如 'backup/'
+        返回 {'transferred': [对象名], 'skipped': 跳过的文件数, 'errors': {对象名: 异常}}
+        """
+        remote = self._remote_objects(bucket, prefix)
+
+        def tasks():
+            for file_path, rel_path in self._local_files(local_dir):
+                key = prefix + rel_path
+                stat = os.stat(file_path)
+                if not self.upload_needed(file_path, stat, remote.get(key)):
+                    yield key, stat.st_size, None, None
+                    continue
+                yield (key, stat.st_size,
+                       partial(self._upload_small, bucket, key, file_path),
+                       partial(self._upload_large, bucket, key, file_path))
+
+        return self._run(tasks())
+
+    def _upload_small(self, bucket, key, file_path):
+        # sent as is: a compressed object would be listed with a size and an
+        # ETag that never match the local file, and be uploaded on every run
+        with open(file_path, 'rb') as f:
+            self.api.put_object(bucket, key, f, compress=False)
+
+    def _upload_large(self, bucket, key, file_path, pool):
+        part_size = max(self.part_size, min_part_size(os.path.getsize(file_path)))
+        uploader = MultipartUploader(self.api, bucket, key, part_size=part_size)
+        return uploader.upload_file(file_path, pool=pool)
+
+    def download_dir(self, bucket, prefix, local_dir):
+        """
+        将桶内指定前缀的对象同步到本地目录，只下载新增或变化的对象
+        参数:
+            bucket: 桶名
+            prefix: 对象名前缀
+            local_dir: 本地目录
+        返回 {'transferred': [对象名], 'skipped': 跳过的对象数, 'errors': {对象名: 异常}}
+        注意：对象名中的 .. 等使路径落在 local_dir 之外时不下载，作为错误返回
+        """
+        # read the whole listing first, large files are downloaded while the
+        # tasks are produced and would leave the listing connection idle
+        remote = self._remote_objects(bucket, prefix)
+        root = os.path.abspath(local_dir)
+        rejected = {}
+
+        def tasks():
+            for key in sorted(remote):
+                record = remote[key]
+                if key.endswith('/'):
+                    continue
+                rel_path = key[len(prefix):].lstrip('/')
+                file_path = os.path.normpath(os.path.join(root, *rel_path.split('/')))
+                if not file_path.startswith(os.path.join(root, '')):
+                    rejected[key] = ProductAPIError(
+                        'object key %s resolves outside %s' % (key, local_dir))
+                    continue
+                if not self._download_needed(bucket, file_path, record):
+                    yield key, record.size, None, None
+                    continue
+                yield (key, record.size,
+                       partial(self._download_small, bucket, record, file_path),
+                       partial(self._download_large, bucket, record, file_path))
+
+        result = self._run(tasks())
+        result['errors'].update(rejected)
+        return result
+
+    @staticmethod
+    def _prepare_dir(file_path):
+        directory = os.path.dirname(file_path)
+        if directory and not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+
+    @staticmethod
+    def _set_mtime(file_path, record):
+        # keep the remote modification time so the next sync sees no change
+        mtime = parse_iso8601(record.last_modified)
+        if mtime:
+            os.utime(file_path, (mtime, mtime))
+
+    def _download_small(self, bucket, record, file_path):
+        self._prepare_dir(file_path)
+        self.api.download_object_to_file(bucket, record.key, file_path)
+        self._set_mtime(file_path, record)
+
+    def _download_large(self, bucket, record, file_path, pool):
+        self._prepare_dir(file_path)
+        downloader = RangeDownloader(self.api, bucket, record.key, part_size=self.part_size)
+        downloader.download_file(file_path, pool=pool)
+        self._set_mtime(file_path, record)
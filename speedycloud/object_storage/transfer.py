@@ -0,0 +1,500 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import time
+import urllib
+import threading
+
+from speedycloud.object_storage import ProductAPIError
+from speedycloud.object_storage.integrity import multipart_etag, verify_etag
+from speedycloud.object_storage.models import findtext, load_etree
+from speedycloud.object_storage.streams import FileSlice, write_chunks
+from speedycloud.object_storage.workers import WorkerPool
+
+MB = 1024 * 1024
+DEFAULT_PART_SIZE = 20 * MB
+DEFAULT_WORKERS = 4
+DEFAULT_MULTIPART_THRESHOLD = 64 * MB
+# server side copies move no data through the client, so larger parts
+# only mean fewer requests
+DEFAULT_COPY_PART_SIZE = 512 * MB
+DEFAULT_PART_SECONDS = 10
+MIN_PART_SIZE = 5 * MB
+MAX_PART_SIZE = 5 * 1024 * MB
+MAX_PARTS = 10000
+MAX_OBJECT_SIZE = 5 * 1024 * 1024 * MB
+
+
+def _round_up(value, unit):
+    return (value + unit - 1) // unit * unit
+
+
+def min_part_size(length, parts=MAX_PARTS):
+    """
+    在分段数上限内上传 length 字节所需的最小分段大小
+    """
+    return max(MIN_PART_SIZE, _round_up(-(-length // parts), MB))
+
+
+def choose_part_size(length, target_throughput=None, part_seconds=DEFAULT_PART_SECONDS):
+    """
+    根据文件大小和目标吞吐量选择分段大小
+    参数:
+        length: 文件大小（字节）
+        target_throughput: 单个连接预期的吞吐量（字节/秒），分段大小取约 part_seconds 秒的传输量
+        part_seconds: 每个分段期望的传输时间（秒）
+    注意：结果按 MB 取整，不小于 5MB，并保证分段数不超过 10000
+    """
+    size = DEFAULT_PART_SIZE
+    if target_throughput:
+        size = _round_up(int(target_throughput * part_seconds), MB)
+    return min(MAX_PART_SIZE, max(size, min_part_size(length)))
+
+
+class PartSizer(object):
+    """
+    运行时根据分段的实际耗时调整后续分段的大小，使每个分段的传输时间接近 part_seconds
+    参数:
+        part_size: 初始分段大小（字节）
+        part_seconds: 每个分段期望的传输时间（秒）
+    """
+
+    def __init__(self, part_size, part_seconds=DEFAULT_PART_SECONDS):
+        self.part_size = part_size
+        self.part_seconds = part_seconds
+        self.throughput = None
+        self.lock = threading.Lock()
+
+    def record(self, size, seconds):
+        """
+        记录一个分段的大小和耗时
+        """
+        if seconds <= 0:
+            return
+        self.lock.acquire()
+        try:
+            rate = size / seconds
+            if self.throughput is None:
+                self.throughput = rate
+            else:
+                # exponential moving average smooths out single slow parts
+                self.throughput = 0.7 * self.throughput + 0.3 * rate
+            wanted = _round_up(int(self.throughput * self.part_seconds), MB)
+            # change at most by a factor of two per measurement
+            wanted = max(self.part_size // 2, min(self.part_size * 2, wanted))
+            self.part_size = min(MAX_PART_SIZE, max(MIN_PART_SIZE, wanted))
+        finally:
+            self.lock.release()
+
+    def next_size(self, remaining, parts_left):
+        """
+        下一个分段的大小，保证剩余数据能在剩余的分段数内上传完
+        """
+        self.lock.acquire()
+        try:
+            size = max(self.part_size, min_part_size(remaining, parts_left))
+        finally:
+            self.lock.release()
+        return min(size, remaining)
+
+
+def iter_parts(length, part_size):
+    """
+    按分段大小切分文件，依次返回 (分段号, 偏移量, 分段长度)
+    """
+    count = length // part_size
+    if length % part_size != 0 or count == 0:
+        count += 1
+    for k in range(count):
+        offset = k * part_size
+        yield k + 1, offset, min(part_size, length - offset)
+
+
+def complete_multipart_body(etags):
+    """
+    生成 CompleteMultipartUpload 请求体，分段按分段号升序排列
+    参数:
+        etags: {分段号: etag}
+    """
+    s = ''.join('<Part><PartNumber>%s</PartNumber><ETag>%s</ETag></Part>' % (n, etags[n])
+                for n in sorted(etags))
+    return '<CompleteMultipartUpload>' + s + '</CompleteMultipartUpload>'
+
+
+def complete_multipart(api, bucket, key, upload_id, etags, params=None):
+    """
+    完成分段上传，返回响应内容；服务端返回的 ETag 与各分段 MD5 组合出的 ETag 不一致时
+    抛出 IntegrityError
+    参数:
+        etags: {分段号: etag}
+    """
+    path = api._get_path('%s/%s?uploadId=%s' % (bucket, urllib.quote(key), upload_id))
+    resp = api.send('POST', path, complete_multipart_body(etags), params or {})
+    if resp.status != 200:
+        raise ProductAPIError('POST %s failed: %s %s %s' % (
+            path, resp.status, resp.reason, resp.body))
+    if api.verify_integrity:
+        # the service may report an error inside a 200 response
+        root = load_etree().fromstring(resp.body)
+        if findtext(root, 'Code'):
+            raise ProductAPIError('POST %s failed: %s' % (path, resp.body))
+        verify_etag(multipart_etag(etags), findtext(root, 'ETag'),
+                    'complete multipart upload %s/%s' % (bucket, key))
+    return resp.body
+
+
+def copy_params(headers):
+    """
+    根据源对象的响应头生成复制目标的请求参数：Content-Type、Content-Encoding 和 x-amz-meta-*
+    参数:
+        headers: head_object 返回的响应头字典
+    """
+    params = {}
+    for name, value in headers.items():
+        name = name.lower()
+        if name.startswith('x-amz-meta-'):
+            params[name] = value
+        elif name == 'content-type':
+            params['content_type'] = value
+        elif name == 'content-encoding':
+            params['content_encoding'] = value
+    return params
+
+
+class MultipartUploader(object):
+    """
+    并发分段上传
+    参数:
+        api: ObjectStorageAPI 实例
+        bucket: 桶名
+        key: 对象名
+        params: 参数，例如 Content-Type
+        part_size: 分段大小（字节）
+        workers: 并发上传的线程数
+        max_in_flight: 等待上传的分段数上限，默认与 workers 相同
+        journal_path: 断点记录文件的路径，指定后上传中断可以续传
+        adaptive: 为 True 时根据已完成分段的耗时调整后续分段大小，与 journal_path 不能同时使用
+    注意：分段以 FileSlice 的形式按块读取发送，内存占用与分段大小无关；
+        没有 journal_path 时上传失败会取消分段上传，释放已上传的分段
+    """
+
+    def __init__(self, api, bucket, key, params=None, part_size=DEFAULT_PART_SIZE,
+                 workers=DEFAULT_WORKERS, max_in_flight=None, journal_path=None,
+                 adaptive=False):
+        if part_size <= 0:
+            raise ValueError('part_size must be positive')
+        self.api = api
+        self.bucket = bucket
+        self.key = key
+        self.params = params if params is not None else {}
+        self.part_size = part_size
+        self.workers = workers
+        self.max_in_flight = max_in_flight if max_in_flight is not None else workers
+        self.etags = {}
+        self.lock = threading.Lock()
+        self.failure = None
+        self.journal = None
+        if journal_path:
+            # only resumable uploads need the journal (and json)
+            from speedycloud.object_storage.journal import UploadJournal
+            self.journal = UploadJournal(journal_path)
+        if adaptive and self.journal is not None:
+            # resuming relies on every run cutting the file at the same offsets
+            raise ValueError('adaptive part sizing can not be used with a journal')
+        self.sizer = PartSizer(part_size) if adaptive else None
+
+    def _upload_part(self, data, part_number, upload_id):
+        if self.failure is not None:
+            return
+        try:
+            start = time.time()
+            with data:
+                etag = self.api.upload_part(self.bucket, self.key, data, part_number, upload_id)
+            if self.sizer is not None:
+                self.sizer.record(len(data), time.time() - start)
+        except Exception, e:
+            self.failure = e
+            raise
+        self.lock.acquire()
+        try:
+            self.etags[part_number] = etag
+        finally:
+            self.lock.release()
+        if self.journal is not None:
+            self.journal.record_part(part_number, etag)
+
+    def _resume(self, file_path):
+        """
+        根据断点记录和服务端的分段列表恢复上传，返回 uploadID，无法恢复时返回 None
+        """
+        description = self.journal.describe(self.bucket, self.key, file_path, self.part_size)
+        state = self.journal.load()
+        if state is None:
+            return None, description
+        if not self.journal.matches(description):
+            # the file or the part size changed, the old upload is useless
+            try:
+                # the journal stores names as unicode, requests take UTF-8
+                self.api.abort_multipart_upload(state['bucket'].encode('utf-8'),
+                                                state['key'].encode('utf-8'), state['upload_id'])
+            except (ProductAPIError, IOError):
+                pass
+            return None, description
+        try:
+            uploaded = self.api.list_parts(self.bucket, self.key, state['upload_id'])
+        except ProductAPIError:
+            return None, description
+        # only trust parts that the journal recorded and the server confirms
+        for part_number, etag in state['parts'].items():
+            if part_number in uploaded and uploaded[part_number][0] == etag:
+                self.etags[part_number] = etag
+        return state['upload_id'], description
+
+    def _iter_adaptive_parts(self, length):
+        # sizes are decided one part at a time, when the part is handed to
+        # the pool, so they follow the latency measured so far
+        part_number = 1
+        offset = 0
+        while True:
+            size = self.sizer.next_size(length - offset, MAX_PARTS - part_number + 1)
+            yield part_number, offset, size
+            offset += size
+            part_number += 1
+            if offset >= length:
+                break
+
+    def upload_file(self, file_path, pool=None):
+        """
+        上传本地文件，返回完成分段上传请求的响应内容
+        参数:
+            file_path: 文件的路径
+            pool: 共享的 WorkerPool，为 None 时使用 workers 个线程的独立任务池
+        """
+        length = os.path.getsize(file_path)
+        if self.sizer is not None:
+            parts = self._iter_adaptive_parts(length)
+        else:
+            parts = list(iter_parts(length, self.part_size))
+            if len(parts) > MAX_PARTS:
+                raise ProductAPIError(
+                    'file needs %d parts, more than the limit of %d' % (len(parts), MAX_PARTS))
+        upload_id = None
+        if self.journal is not None:
+            upload_id, description = self._resume(file_path)
+        if upload_id is None:
+            upload_id = self.api.initiate_multipart_upload(self.bucket, self.key, self.params)
+            if self.journal is not None:
+                self.journal.start(description, upload_id)
+        else:
+            self.journal.start(description, upload_id, self.etags)
+        futures = []
+        try:
+            own_pool = pool is None
+            if own_pool:
+                pool = WorkerPool(self.workers, self.max_in_flight)
+            try:
+                for part_number, offset, size in parts:
+                    if self.failure is not None:
+                        break
+                    if part_number in self.etags:
+                        continue
+                    futures.append(pool.submit(
+                        self._upload_part, FileSlice(file_path, offset, size), part_number,
+                        upload_id))
+            finally:
+                if own_pool:
+                    pool.shutdown()
+            for future in futures:
+                future.result()
+            result = self.complete(upload_id)
+        except:
+            if self.journal is not None:
+                # the journal keeps the upload so a later call can resume it
+                raise
+            exc_info = sys.exc_info()
+            # parts of a shared pool may still be running, let them finish
+            # so none is stored after the abort
+            for future in futures:
+                future.exception()
+            try:
+                self.api.abort_multipart_upload(self.bucket, self.key, upload_id)
+            except (ProductAPIError, IOError):
+                pass
+            raise exc_info[0], exc_info[1], exc_info[2]
+        if self.journal is not None:
+            self.journal.remove()
+        return result
+
+    def complete(self, upload_id):
+        """
+        完成分段上传，返回响应内容；服务端返回的 ETag 与各分段 MD5 组合出的 ETag 不一致时
+        抛出 IntegrityError
+        """
+        return complete_multipart(self.api, self.bucket, self.key, upload_id, self.etags,
+                                  self.params)
+
+
+class MultipartCopier(object):
+    """
+    在服务端并发复制大对象：源对象按字节范围复制为目标对象的各个分段，数据不经过本地
+    参数:
+        api: ObjectStorageAPI 实例
+        src_bucket: 源桶名
+        src_key: 源对象名
+        bucket: 目标桶名
+        key: 目标对象名
+        params: 目标对象的请求头参数，例如 content_type、x-amz-meta-*；
+            None 时沿用源对象的 Content-Type、Content-Encoding 和自定义元数据
+        part_size: 分段大小（字节），对象过大时自动放大以满足 10000 个分段的限制
+        workers: 并发复制的线程数
+    注意：各分段的复制请求带有 x-amz-copy-source-if-match，复制过程中源对象被修改时
+        复制失败；失败时取消分段上传
+    """
+
+    def __init__(self, api, src_bucket, src_key, bucket, key, params=None,
+                 part_size=DEFAULT_COPY_PART_SIZE, workers=DEFAULT_WORKERS):
+        if part_size <= 0:
+            raise ValueError('part_size must be positive')
+        self.api = api
+        self.src_bucket = src_bucket
+        self.src_key = src_key
+        self.bucket = bucket
+        self.key = key
+        self.params = params
+        self.part_size = part_size
+        self.workers = workers
+        self.etags = {}
+        self.lock = threading.Lock()
+        self.failure = None
+
+    def _copy_part(self, part_number, offset, size, upload_id, source_etag):
+        if self.failure is not None:
+            return
+        try:
+            etag = self.api.upload_part_copy(
+                self.bucket, self.key, part_number, upload_id, self.src_bucket, self.src_key,
+                (offset, offset + size - 1), source_etag)
+        except Exception, e:
+            self.failure = e
+            raise
+        self.lock.acquire()
+        try:
+            self.etags[part_number] = etag
+        finally:
+            self.lock.release()
+
+    def copy(self, source=None, pool=None):
+        """
+        复制对象，返回完成分段上传请求的响应内容
+        参数:
+            source: 源对象的响应头字典（head_object 的返回值），None 时自动查询
+            pool: 共享的 WorkerPool，为 None 时使用 workers 个线程的独立任务池
+        """
+        if source is None:
+            source = self.api.head_object(self.src_bucket, self.src_key)
+        length = int(source['content-length'])
+        if length == 0:
+            raise ProductAPIError('empty objects can not be copied in parts, use copy_object')
+        if length > MAX_OBJECT_SIZE:
+            raise ProductAPIError('object is bigger than %d bytes' % MAX_OBJECT_SIZE)
+        part_size = max(self.part_size, min_part_size(length))
+        params = self.params if self.params is not None else copy_params(source)
+        upload_id = self.api.initiate_multipart_upload(self.bucket, self.key, params)
+        try:
+            futures = []
+            own_pool = pool is None
+            if own_pool:
+                pool = WorkerPool(self.workers)
+            try:
+                for part_number, offset, size in iter_parts(length, part_size):
+                    if self.failure is not None:
+                        break
+                    futures.append(pool.submit(self._copy_part, part_number, offset, size,
+                                               upload_id, source.get('etag')))
+            finally:
+                if own_pool:
+                    pool.shutdown()
+            for future in futures:
+                future.result()
+            return complete_multipart(self.api, self.bucket, self.key, upload_id, self.etags)
+        except:
+            exc_info = sys.exc_info()
+            # nothing can resume a copy, release the parts copied so far
+            try:
+                self.api.abort_multipart_upload(self.bucket, self.key, upload_id)
+            except (ProductAPIError, IOError):
+                pass
+            raise exc_info[0], exc_info[1], exc_info[2]
+
+
+class RangeDownloader(object):
+    """
+    按字节范围并发下载对象，各范围写入预先分配好的本地文件的对应位置
+    参数:
+        api: ObjectStorageAPI 实例
+        bucket: 桶名
+        key: 对象名
+        part_size: 每个范围的大小（字节）
+        workers: 并发下载的线程数
+    """
+
+    def __init__(self, api, bucket, key, part_size=DEFAULT_PART_SIZE, workers=DEFAULT_WORKERS):
+        if part_size <= 0:
+            raise ValueError('part_size must be positive')
+        self.api = api
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.workers = workers
+        self.failure = None
+
+    def _download_range(self, file_path, offset, size):
+        if self.failure is not None:
+            return
+        try:
+            resp = self.api.download_object_stream(
+                self.bucket, self.key, (offset, offset + size - 1))
+            with resp:
+                if resp.status != 206:
+                    raise ProductAPIError(
+                        'expected 206 for range %d-%d, got %s' % (
+                            offset, offset + size - 1, resp.status))
+                with open(file_path, 'r+b') as f:
+                    f.seek(offset)
+                    written = write_chunks(resp, f)
+            if written != size:
+                raise ProductAPIError(
+                    'range %d-%d returned %d bytes' % (offset, offset + size - 1, written))
+        except Exception, e:
+            self.failure = e
+            raise
+
+    def download_file(self, file_path, pool=None):
+        """
+        下载对象到本地文件，返回对象大小
+        参数:
+            file_path: 本地文件的路径
+            pool: 共享的 WorkerPool，为 None 时使用 workers 个线程的独立任务池
+        """
+        headers = self.api.head_object(self.bucket, self.key)
+        length = int(headers['content-length'])
+        with open(file_path, 'wb') as f:
+            f.truncate(length)
+        if length == 0:
+            return 0
+        futures = []
+        own_pool = pool is None
+        if own_pool:
+            pool = WorkerPool(self.workers)
+        try:
+            for part_number, offset, size in iter_parts(length, self.part_size):
+                if self.failure is not None:
+                    break
+                futures.append(pool.submit(self._download_range, file_path, offset, size))
+        finally:
+            if own_pool:
+                pool.shutdown()
+        for future in futures:
+            future.result()
+        return length
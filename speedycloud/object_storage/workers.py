@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+import sys
+import time
+import threading
+import Queue
+
+
+class Future(object):
+    """
+    后台任务的执行结果
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._exc_info = None
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def done(self):
+        return self._event.isSet()
+
+    def result(self, timeout=None):
+        self._event.wait(timeout)
+        if not self._event.isSet():
+            raise Queue.Empty('future is not done after %s seconds' % timeout)
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+    def exception(self, timeout=None):
+        self._event.wait(timeout)
+        if self._exc_info is not None:
+            return self._exc_info[1]
+        return None
+
+    def add_done_callback(self, fn):
+        self._lock.acquire()
+        try:
+            if not self._event.isSet():
+                self._callbacks.append(fn)
+                return
+        finally:
+            self._lock.release()
+        fn(self)
+
+    def set_result(self, result):
+        self._result = result
+        self._finish()
+
+    def set_exc_info(self, exc_info):
+        self._exc_info = exc_info
+        self._finish()
+
+    def _finish(self):
+        self._lock.acquire()
+        try:
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        finally:
+            self._lock.release()
+        for fn in callbacks:
+            fn(self)
+
+
+class WorkerPool(object):
+    """
+    固定线程数的任务池
+    参数:
+        workers: 工作线程数上限
+        max_pending: 排队任务上限，队列满时 submit 会阻塞，用于限制内存占用
+    注意：线程在提交任务且没有空闲线程时才创建，创建任务池本身不启动线程
+    """
+
+    def __init__(self, workers=4, max_pending=None):
+        if workers < 1:
+            raise ValueError('workers must be at least 1')
+        if max_pending is None:
+            max_pending = workers
+        self.workers = workers
+        self.tasks = Queue.Queue(max_pending)
+        self.threads = []
+        self.closed = False
+        self.lock = threading.Lock()
+        # threads waiting for a task that no submit has claimed yet
+        self.idle = 0
+
+    def _run(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            future, fn, args, kwargs = task
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except:
+                future.set_exc_info(sys.exc_info())
+            self.lock.acquire()
+            self.idle += 1
+            self.lock.release()
+
+    def _reserve_thread(self):
+        self.lock.acquire()
+        try:
+            if self.idle:
+                self.idle -= 1
+            elif len(self.threads) < self.workers:
+                t = threading.Thread(target=self._run)
+                t.setDaemon(True)
+                t.start()
+                self.threads.append(t)
+        finally:
+            self.lock.release()
+
+    def submit(self, fn, *args, **kwargs):
+        if self.closed:
+            raise RuntimeError('cannot submit to a closed WorkerPool')
+        future = Future()
+        self._reserve_thread()
+        self.tasks.put((future, fn, args, kwargs))
+        return future
+
+    def map(self, fn, iterable):
+        return [self.submit(fn, item) for item in iterable]
+
+    def shutdown(self, wait=True):
+        if self.closed:
+            return
+        self.closed = True
+        self.lock.acquire()
+        try:
+            threads = list(self.threads)
+        finally:
+            self.lock.release()
+        for t in threads:
+            self.tasks.put(None)
+        if wait:
+            for t in threads:
+                t.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+class RateLimiter(object):
+    """
+    令牌桶限速器，多个线程共享同一个带宽预算
+    参数:
+        rate: 每秒允许的字节数
+        burst: 令牌桶容量，默认为一秒的流量
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else rate)
+        self.tokens = self.burst
+        self.last = time.time()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        """
+        取出 amount 个令牌，令牌不足时阻塞等待
+        """
+        self.lock.acquire()
+        try:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+            # let the balance go negative so chunks larger than the bucket
+            # still pass, later callers wait for the debt to be repaid
+            self.tokens -= amount
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        finally:
+            self.lock.release()
+        if delay > 0:
+            time.sleep(delay)